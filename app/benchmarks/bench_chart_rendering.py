@@ -0,0 +1,86 @@
+"""
+Per-figure rendering overhead: one to_image call per chart vs the warm, batched renderer vs the matplotlib backend.
+
+Every mode renders the charts of a user in memory, at the size of their
+report slots, as users_chart_creator does (user_chart_images): building the
+figures is timed as well.
+
+Run from the app folder:
+    python -m benchmarks.bench_chart_rendering --users 10 --weeks 4
+"""
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from tools.config import CHART_COLUMNS
+from tools.chart_renderer import render_figures, start_renderer, stop_renderer, renderer_stats
+from tools.dataprocessing import REPORT_DESCRIPTION
+from tools.generate_charts import user_chart_images, report_chart_slots, slot_layout, build_weekly_bar_chart, build_daily_bar_chart, WEEKLY_CHART_SIZE, DAILY_CHART_SIZE
+
+# Title and the five info lines of create_text_parameters; only their count sizes the slots
+REPORT_TEXT = ("Report", "Employee ID|Name|Reports To|Days with Zero Productive Hours|Weeks Below Threshold", REPORT_DESCRIPTION)
+
+def synthetic_user_frames(weeks: int, seed: int = 0):
+    """Builds the weekly frame and the (week, week_time_df) pairs of one synthetic user."""
+    rng = np.random.default_rng(seed)
+    first_week = pd.Timestamp("2026-01-04")
+    daily = pd.DataFrame({"Date": pd.date_range(first_week, periods=weeks * 7)})
+    for col in CHART_COLUMNS:
+        daily[col] = rng.uniform(0, 2, len(daily))
+    daily["Total Hours"] = daily[CHART_COLUMNS].sum(axis=1)
+    daily["Week"] = daily["Date"].dt.to_period("W-SAT").dt.start_time
+    weekly = daily.groupby("Week", as_index=False).agg({col: "sum" for col in CHART_COLUMNS} | {"Total Hours": "mean"})
+    weekly = weekly.rename(columns={"Total Hours": "Daily Productive Average"})
+    weekly["Total Hours"] = weekly[CHART_COLUMNS].sum(axis=1)
+
+    week_frames = []
+    for week, week_df in daily.groupby("Week"):
+        week_df = week_df.copy()
+        week_df["Daily Productive Accumulated Average"] = week_df["Total Hours"].expanding().mean()
+        week_frames.append((week, week_df))
+    return weekly, week_frames
+
+def per_figure_chart_bytes(weekly, week_frames, slot_sizes) -> list:
+    """The plotly charts of a user rendered one to_image call at a time, as before the warm renderer."""
+    weekly_slot, daily_slot = slot_sizes
+    figures = [build_weekly_bar_chart(weekly)] + [build_daily_bar_chart(week_df, week) for week, week_df in week_frames]
+    layouts = [slot_layout(WEEKLY_CHART_SIZE, weekly_slot)] + [slot_layout(DAILY_CHART_SIZE, daily_slot)] * len(week_frames)
+    widths, heights, scales = (list(values) for values in zip(*layouts))
+    return render_figures(figures, [None] * len(figures), widths, heights, scale=scales, batched=False)
+
+def run(users: int, weeks: int):
+    users_frames = [synthetic_user_frames(weeks, seed) for seed in range(users)]
+    slot_sizes = report_chart_slots(REPORT_TEXT, weeks)
+    total = users * (weeks + 1)
+    results = {}
+    start_time = time.perf_counter()
+    for weekly, week_frames in users_frames:
+        per_figure_chart_bytes(weekly, week_frames, slot_sizes)
+    results["per-figure to_image"] = (time.perf_counter() - start_time) / total
+
+    start_renderer()
+    try:
+        batches = renderer_stats()["batches"]
+        start_time = time.perf_counter()
+        for weekly, week_frames in users_frames:
+            user_chart_images(weekly, week_frames, slot_sizes, backend="plotly")
+        results["warm batched"] = (time.perf_counter() - start_time) / total
+        batches = renderer_stats()["batches"] - batches
+    finally:
+        stop_renderer()
+
+    start_time = time.perf_counter()
+    for weekly, week_frames in users_frames:
+        user_chart_images(weekly, week_frames, slot_sizes, backend="matplotlib")
+    results["matplotlib backend"] = (time.perf_counter() - start_time) / total
+    for mode, seconds in results.items():
+        print(f"{mode:>24}: {seconds * 1000:.1f} ms per figure ({total} figures)")
+    if not batches:
+        print("The warm renderer fell back to one to_image call per figure (needs kaleido >= 1.0 and plotly >= 6.1)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--weeks", type=int, default=4)
+    args = parser.parse_args()
+    run(args.users, args.weeks)
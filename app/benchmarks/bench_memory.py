@@ -0,0 +1,97 @@
+"""
+Peak memory of loading and preprocessing the view: classic vs lean frames.
+
+classic: load_data + preprocess_data (object strings, float64 hours, every
+dimension column on every daily row). lean: load_data(lean=True) +
+preprocess_data_lean (Arrow strings while loading, float32 hours and a
+per-EEID dimension table). Each mode runs in a fresh process. The peak is
+the tracemalloc peak (Python objects and NumPy buffers) plus the peak of the
+Arrow memory pool (Arrow-backed strings); the process RSS is dominated by
+the imports and would hide the difference. The frame sizes are pandas' deep
+memory usage.
+
+Run from the app folder:
+    python -m benchmarks.bench_memory --employees 2000 --days 91
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import pandas as pd
+import pyarrow as pa
+
+# Keep the synthetic employees out of the real employee directory cache
+os.environ.setdefault("GAPDAYS_CACHE_DIR", os.path.join(tempfile.gettempdir(), "gapdays_bench_cache"))
+
+from tools.connections import create_sqlalchemy_engine
+from tools.dataprocessing import generate_query, load_data, preprocess_data, preprocess_data_lean
+from benchmarks.workload import synthetic_view_rows, load_into_sqlite, date_span
+from benchmarks.results import RESULTS_FOLDER, make_result, append_results
+
+MODES = ("classic", "lean")
+
+def frame_mb(df: pd.DataFrame) -> float:
+    return float(df.memory_usage(deep=True).sum()) / (1024 * 1024)
+
+def measure(mode: str, database_path: str, start_date, end_date) -> dict:
+    """Loads and preprocesses the database in this (fresh) process and returns its memory figures."""
+    tracemalloc.start()
+    engine = create_sqlalchemy_engine(f"sqlite:///{database_path}")
+    start_time = time.perf_counter()
+    try:
+        with engine.connect() as conn:
+            df = load_data(conn, generate_query(report_type=1, start_date=start_date, end_date=end_date), verbose=False, lean=mode == "lean")
+    finally:
+        engine.dispose()
+    raw_mb = frame_mb(df)
+    if mode == "lean":
+        daily_df, dimensions = preprocess_data_lean(df)
+    else:
+        daily_df, dimensions = preprocess_data(df), None
+    del df
+    seconds = time.perf_counter() - start_time
+    traced_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    arrow_peak = pa.default_memory_pool().max_memory() or 0
+    return {
+        "seconds": seconds,
+        "peak_mb": (traced_peak + arrow_peak) / (1024 * 1024),
+        "traced_peak_mb": traced_peak / (1024 * 1024),
+        "arrow_peak_mb": arrow_peak / (1024 * 1024),
+        "raw_frame_mb": raw_mb,
+        "daily_frame_mb": frame_mb(daily_df),
+        "dimensions_mb": frame_mb(dimensions) if dimensions is not None else 0.0,
+        "daily_rows": len(daily_df),
+    }
+
+def run(employees: int, days: int, save: bool = True):
+    view_df = synthetic_view_rows(employees, days)
+    start_date, end_date = date_span(view_df)
+    rows = len(view_df)
+    results = []
+    with tempfile.TemporaryDirectory() as folder:
+        database_path = Path(folder) / "view.sqlite"
+        load_into_sqlite(view_df, database_path).dispose()
+        del view_df
+        print(f"{employees} employees x {days} days: {rows} view rows")
+        for mode in MODES:
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+                metrics = executor.submit(measure, mode, str(database_path.resolve()), start_date, end_date).result()
+            print(f"  {mode:>8}: peak {metrics['peak_mb']:7.1f} MB ({metrics['arrow_peak_mb']:.1f} MB Arrow), raw frame {metrics['raw_frame_mb']:7.1f} MB, "
+                  f"daily frame {metrics['daily_frame_mb']:6.1f} MB + dimensions {metrics['dimensions_mb']:5.2f} MB, {metrics['seconds']:.1f}s")
+            results.append(make_result("memory", {"employees": employees, "days": days, "mode": mode}, metrics))
+    if save:
+        append_results(results, RESULTS_FOLDER)
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--employees", type=int, default=2000)
+    parser.add_argument("--days", type=int, default=91, help="91 days is a quarter")
+    parser.add_argument("--no-save", action="store_true", help="do not store the results in the history")
+    args = parser.parse_args()
+    run(args.employees, args.days, save=not args.no_save)
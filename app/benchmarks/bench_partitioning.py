@@ -0,0 +1,71 @@
+"""
+Per-user slicing cost in users_chart_creator: boolean mask per user vs one groupby partition.
+
+Run from the app folder:
+    python -m benchmarks.bench_partitioning --users 100 1000 5000 20000 --days 60
+"""
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from tools.config import CHART_COLUMNS
+from tools.dataprocessing import partition_by_eeid, split_weeks, custom_weekly_aggregation
+
+# The mask loop is O(rows x users); past this many users it is timed on a sample and extrapolated
+MASK_SAMPLE_USERS = 500
+
+def synthetic_daily(users: int, days: int, seed: int = 0) -> pd.DataFrame:
+    """Builds a preprocessed-like daily frame with one row per (Date, EEID)."""
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2026-01-04", periods=days)
+    df = pd.DataFrame({
+        "Date": np.tile(dates, users),
+        "EEID": np.repeat([f"A{i:05d}" for i in range(users)], days),
+    })
+    for col in CHART_COLUMNS:
+        df[col] = rng.uniform(0, 2, len(df))
+    df["Week"] = df["Date"].dt.to_period("W-SAT").dt.start_time
+    df["Productive Only"] = df[CHART_COLUMNS].sum(axis=1)
+    df["Total Hours"] = df["Productive Only"]
+    return df
+
+def slice_with_masks(daily_df, weekly_df, eeids):
+    for eeid in eeids:
+        daily_user_df = daily_df[daily_df["EEID"] == eeid]
+        weekly_df[weekly_df["EEID"] == eeid]
+        for week in sorted(daily_user_df["Week"].unique()):
+            daily_user_df[daily_user_df["Week"] == week]
+
+def slice_with_partitions(daily_df, weekly_df, eeids):
+    daily_by_eeid = partition_by_eeid(daily_df)
+    weekly_by_eeid = partition_by_eeid(weekly_df)
+    for eeid in eeids:
+        weekly_by_eeid[eeid]
+        split_weeks(daily_by_eeid[eeid])
+
+def run(user_counts, days):
+    print(f"{'users':>8} {'rows':>10} {'mask loop (s)':>16} {'partitioned (s)':>16} {'speed-up':>9}")
+    for users in user_counts:
+        daily_df = synthetic_daily(users, days)
+        weekly_df = custom_weekly_aggregation(daily_df)
+        eeids = weekly_df["EEID"].unique()
+
+        sample = eeids[:MASK_SAMPLE_USERS]
+        start_time = time.perf_counter()
+        slice_with_masks(daily_df, weekly_df, sample)
+        mask_seconds = (time.perf_counter() - start_time) * len(eeids) / len(sample)
+
+        start_time = time.perf_counter()
+        slice_with_partitions(daily_df, weekly_df, eeids)
+        partition_seconds = time.perf_counter() - start_time
+
+        estimated = "*" if len(sample) < len(eeids) else " "
+        print(f"{users:>8} {len(daily_df):>10} {mask_seconds:>15.2f}{estimated} {partition_seconds:>16.2f} {mask_seconds / partition_seconds:>8.1f}x")
+    print(f"* extrapolated from the first {MASK_SAMPLE_USERS} users")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, nargs="+", default=[100, 1000, 5000, 20000])
+    parser.add_argument("--days", type=int, default=60)
+    args = parser.parse_args()
+    run(args.users, args.days)
@@ -0,0 +1,118 @@
+"""
+End-to-end gap days pipeline on a synthetic workload served by a SQLite stand-in for the view.
+
+For every scale: generate the view rows, load them into SQLite, then run
+load_data, preprocess_data, custom_weekly_aggregation, the filters, the
+rendering of a sample of reports and the CSV dataset. The per-stage times
+are stored in benchmarks/results/history.jsonl and compared with the
+previous runs of the same case.
+
+Run from the app folder:
+    python -m benchmarks.bench_pipeline --employees 500 2000 10000 --days 56 --render-users 20
+"""
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+import pandas as pd
+
+# Keep the synthetic employees out of the real employee directory cache
+os.environ.setdefault("GAPDAYS_CACHE_DIR", os.path.join(tempfile.gettempdir(), "gapdays_bench_cache"))
+
+from tools.config import DATASET_COLUMNS
+from tools.dataprocessing import (
+    generate_query, load_data, preprocess_data, delete_weekend_zero_hours, custom_weekly_aggregation,
+    filter_missing_prod_users, filter_gap_days_users, users_chart_creator, save_status_dataset,
+)
+from tools.profiling import reset_profiling, summarize_stages, summarize_user_times
+from benchmarks.workload import synthetic_view_rows, load_into_sqlite, date_span
+from benchmarks.results import RESULTS_FOLDER, REGRESSION_THRESHOLD, make_result, load_history, append_results, flag_regressions
+
+def run_case(employees: int, days: int, render_users: int, chart_backend: str, zero_prod_share: float, gap_share: float) -> dict:
+    """Runs the pipeline once on a fresh synthetic database and returns the seconds per stage."""
+    view_df = synthetic_view_rows(employees, days, zero_prod_share=zero_prod_share, gap_share=gap_share)
+    start_date, end_date = date_span(view_df)
+    with tempfile.TemporaryDirectory() as folder:
+        engine = load_into_sqlite(view_df, Path(folder) / "view.sqlite")
+        del view_df
+        reset_profiling()
+        start_time = time.perf_counter()
+        try:
+            with engine.connect() as conn:
+                df = load_data(conn, generate_query(report_type=1, start_date=start_date, end_date=end_date), verbose=False)
+        finally:
+            engine.dispose()
+        daily_df = preprocess_data(df)
+        cleaned_daily_df = delete_weekend_zero_hours(daily_df)
+        weekly_df = custom_weekly_aggregation(cleaned_daily_df)
+        _, eeid_missing_prod = filter_missing_prod_users(weekly_df)
+        weekly_filtered_gaps_df, eeid_with_gaps = filter_gap_days_users(weekly_df, eeid_missing_prod)
+
+        sample = eeid_with_gaps[:render_users]
+        week_start = min(daily_df['Week']).strftime('%b %d, %Y')
+        week_end = (max(daily_df['Week']) + pd.Timedelta(days=6)).strftime('%b %d, %Y')
+        if len(sample):
+            users_chart_creator(
+                cleaned_daily_df[cleaned_daily_df['EEID'].isin(sample)],
+                weekly_filtered_gaps_df[weekly_filtered_gaps_df['EEID'].isin(sample)],
+                f"{folder}/", week_start, week_end, report_type=1,
+                workers=1, chart_backend=chart_backend, incremental=False,
+            )
+        save_status_dataset(
+            daily_df,
+            DATASET_COLUMNS,
+            {'Gap_Status': eeid_with_gaps, 'Missing_Prod_Status': eeid_missing_prod},
+            f"{folder}/dataset.csv",
+        )
+        total = time.perf_counter() - start_time
+
+    metrics = {name: values["wall_seconds"] for name, values in summarize_stages().items()}
+    reports = summarize_user_times().get("1")
+    if reports:
+        metrics["report_p50"] = reports["p50"]
+        metrics["report_p95"] = reports["p95"]
+    metrics["total"] = total
+    print(f"{employees:>8} employees: {len(df):>9} view rows, {len(daily_df):>8} daily rows, "
+          f"{len(eeid_missing_prod)} zero-prod and {len(eeid_with_gaps)} gap users, {total:.1f}s")
+    return metrics
+
+def run(employee_counts, days: int, render_users: int, chart_backend: str, zero_prod_share: float, gap_share: float,
+        results_folder=RESULTS_FOLDER, threshold: float = REGRESSION_THRESHOLD, save: bool = True) -> bool:
+    """Runs every scale, stores the results and returns True when no regression was flagged."""
+    history = load_history(results_folder)
+    results = []
+    regressed = False
+    for employees in employee_counts:
+        params = {
+            "employees": employees, "days": days, "render_users": render_users, "chart_backend": chart_backend,
+            "zero_prod_share": zero_prod_share, "gap_share": gap_share,
+        }
+        result = make_result("pipeline", params, run_case(employees, days, render_users, chart_backend, zero_prod_share, gap_share))
+        results.append(result)
+        for name, seconds in result["metrics"].items():
+            print(f"    {name:>14}: {seconds:8.3f}s")
+        flags = flag_regressions(result, history, threshold)
+        for flag in flags:
+            print(f"    REGRESSION {flag}")
+        regressed = regressed or bool(flags)
+    if save:
+        append_results(results, results_folder)
+        print(f"Results appended to {Path(results_folder)}")
+    return not regressed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--employees", type=int, nargs="+", default=[500, 2000, 10000])
+    parser.add_argument("--days", type=int, default=56)
+    parser.add_argument("--render-users", type=int, default=20, help="gap-day reports rendered per scale")
+    parser.add_argument("--chart-backend", default="matplotlib", choices=["plotly", "matplotlib"])
+    parser.add_argument("--zero-prod-share", type=float, default=0.05)
+    parser.add_argument("--gap-share", type=float, default=0.15)
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help="slowdown flagged as a regression (0.2 = 20%%)")
+    parser.add_argument("--results", default=str(RESULTS_FOLDER), help="folder of the results history")
+    parser.add_argument("--no-save", action="store_true", help="compare with the history without storing this run")
+    args = parser.parse_args()
+    ok = run(args.employees, args.days, args.render_users, args.chart_backend, args.zero_prod_share, args.gap_share,
+             results_folder=args.results, threshold=args.threshold, save=not args.no_save)
+    raise SystemExit(0 if ok else 1)
@@ -0,0 +1,117 @@
+"""
+Daily rollup of preprocess_data: the former agg_map rollup vs the fact/dimension split.
+
+The former rollup grouped the raw view rows per (Date, EEID) with a sorted
+groupby, summed the numeric columns and took the 'first' of every other
+column. preprocess_data now sums only the facts on hashed keys and takes
+the dimensions from the deduplicated per-EEID table. Both run on a golden
+dataset (synthetic view rows, shuffled, with a few null keys, null and
+mid-period changes in some dimension columns, single and multi-report),
+and the results must be identical before their times are compared. The
+memory-lean rollup of a server-side aggregated multi-report pull is checked
+against preprocess_data as well.
+
+Run from the app folder:
+    python -m benchmarks.bench_rollup --employees 500 2000 10000 --days 91
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from tools.config import DICT_COL_NAMES, CHART_COLUMNS, PRODUCTIVE_ONLY_COLUMNS, POPULATION_FLAG_PREFIX, EMPLOYEE_IDS
+from tools.dataprocessing import preprocess_data, preprocess_data_lean, explode_populations, generate_query, load_data, split_populations
+from benchmarks.workload import synthetic_view_rows, load_into_sqlite, date_span
+from benchmarks.results import RESULTS_FOLDER, make_result, append_results
+
+def agg_map_rollup(df: pd.DataFrame) -> pd.DataFrame:
+    """The former preprocess_data rollup, kept as the reference result."""
+    df = explode_populations(df)
+    keys = ['Date', 'EEID'] + (['Population'] if 'Population' in df.columns else [])
+    df = df.rename(columns=DICT_COL_NAMES)
+    agg_map = {col: 'sum' if pd.api.types.is_numeric_dtype(dtype) else 'first'
+            for col, dtype in df.dtypes.items() if col != 'Population'}
+    df[CHART_COLUMNS] = df[CHART_COLUMNS].fillna(0).astype(float)
+    df['Date'] = pd.to_datetime(df['Date'])
+    df_grouped = df.groupby(keys, as_index=False).agg(agg_map)
+    df_grouped['Week'] = df_grouped['Date'].dt.to_period('W-SAT').dt.start_time
+    df_grouped['Productive Only'] = df_grouped[PRODUCTIVE_ONLY_COLUMNS].sum(axis=1)
+    df_grouped['Total Hours'] = df_grouped[CHART_COLUMNS].sum(axis=1)
+    return df_grouped
+
+def golden_view_rows(employees: int, days: int, multi: bool = False, seed: int = 0) -> pd.DataFrame:
+    """
+    Synthetic view rows in random order, with missing titles, a few employees
+    changing location mid-period and a few rows without an Employee_ID or AT_Date.
+    """
+    rng = np.random.default_rng(seed)
+    df = synthetic_view_rows(employees, days, seed=seed)
+    df.loc[rng.random(len(df)) < 0.1, 'Title'] = None
+    df.loc[rng.random(len(df)) < 0.05, 'Location'] = "Peru"
+    df.loc[rng.random(len(df)) < 0.001, 'Employee_ID'] = None
+    df.loc[rng.random(len(df)) < 0.001, 'AT_Date'] = None
+    if multi:
+        # A multi-report pull flags the populations of every row (generate_query)
+        for report_type in (1, 3):
+            df[f"{POPULATION_FLAG_PREFIX}{report_type}"] = (rng.random(len(df)) < 0.8).astype(np.int64)
+    return df.sample(frac=1, random_state=seed).reset_index(drop=True)
+
+def check_lean_aggregated(employees: int, days: int, report_types=(1, 3)):
+    """
+    Runs the server-side aggregated multi-report query on the golden rows
+    (SQLite stand-in) and checks that preprocess_data_lean returns the rows
+    and hours of preprocess_data for every population.
+    """
+    view_df = golden_view_rows(employees, days)
+    # Some synthetic employees stand in for the productivity population (EMPLOYEE_IDS)
+    synthetic_ids = view_df['Employee_ID'].dropna().unique()[:len(EMPLOYEE_IDS)]
+    view_df['Employee_ID'] = view_df['Employee_ID'].replace(dict(zip(synthetic_ids, EMPLOYEE_IDS)))
+    start_date, end_date = date_span(view_df)
+    with tempfile.TemporaryDirectory() as folder:
+        engine = load_into_sqlite(view_df, Path(folder) / "view.sqlite")
+        try:
+            with engine.connect() as conn:
+                classic_df = load_data(conn, generate_query(list(report_types), start_date, end_date, aggregate=True, conn=conn), verbose=False)
+                lean_df = load_data(conn, generate_query(list(report_types), start_date, end_date, aggregate=True, conn=conn), verbose=False, lean=True)
+        finally:
+            engine.dispose()
+    expected = split_populations(preprocess_data(classic_df, aggregated=True), report_types)
+    daily_df, _ = preprocess_data_lean(lean_df, aggregated=True)
+    for report_type, population_df in split_populations(daily_df, report_types).items():
+        columns = list(population_df.columns)
+        pd.testing.assert_frame_equal(population_df, expected[report_type][columns], check_dtype=False, rtol=1e-5)
+    print(f"lean aggregated rollup of report types {', '.join(map(str, report_types))} matches ({len(daily_df)} rows)")
+
+def run(employee_counts, days, save: bool = True):
+    results = []
+    print(f"{'employees':>9} {'report':>6} {'rows':>10} {'agg_map (s)':>12} {'split (s)':>10} {'speed-up':>9}")
+    for employees in employee_counts:
+        for multi in (False, True):
+            view_df = golden_view_rows(employees, days, multi)
+
+            start_time = time.perf_counter()
+            expected = agg_map_rollup(view_df.copy())
+            reference_seconds = time.perf_counter() - start_time
+
+            start_time = time.perf_counter()
+            daily_df = preprocess_data(view_df.copy())
+            seconds = time.perf_counter() - start_time
+
+            pd.testing.assert_frame_equal(daily_df, expected, check_exact=True)
+            report = "multi" if multi else "single"
+            print(f"{employees:>9} {report:>6} {len(view_df):>10} {reference_seconds:>12.2f} {seconds:>10.2f} {reference_seconds / seconds:>8.1f}x")
+            results.append(make_result("rollup", {"employees": employees, "days": days, "report": report},
+                                       {"agg_map_seconds": reference_seconds, "rollup_seconds": seconds}))
+    check_lean_aggregated(employee_counts[0], days)
+    if save:
+        append_results(results, RESULTS_FOLDER)
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--employees", type=int, nargs="+", default=[500, 2000, 10000])
+    parser.add_argument("--days", type=int, default=91, help="91 days is a quarter")
+    parser.add_argument("--no-save", action="store_true", help="do not store the results in the history")
+    args = parser.parse_args()
+    run(args.employees, args.days, save=not args.no_save)
@@ -0,0 +1,85 @@
+"""
+Stored benchmark results and regression flags.
+
+Every benchmark run appends one JSON line per measured case to
+benchmarks/results/history.jsonl (benchmark name, parameters, commit and the
+measured seconds). A new result is compared with the median of the previous
+runs of the same case and every metric that got slower by more than the
+threshold is flagged.
+"""
+import json
+import platform
+import subprocess
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+import numpy as np
+
+RESULTS_FOLDER = Path(__file__).resolve().parent / "results"
+HISTORY_FILE_NAME = "history.jsonl"
+
+# A metric is a regression when it is this much slower than the baseline...
+REGRESSION_THRESHOLD = 0.20
+# ...and slower by at least this many seconds (ignores noise on tiny stages)
+REGRESSION_MIN_SECONDS = 0.05
+# Number of previous runs of a case whose median is the baseline
+BASELINE_RUNS = 5
+
+def current_commit():
+    """Returns the short hash of the checked-out commit, or None outside a git checkout."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True, cwd=Path(__file__).resolve().parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def make_result(benchmark: str, params: dict, metrics: Dict[str, float]) -> dict:
+    """Builds a history entry for one measured case."""
+    return {
+        "benchmark": benchmark,
+        "params": params,
+        "metrics": metrics,
+        "recorded_at": datetime.now().isoformat(timespec="seconds"),
+        "commit": current_commit(),
+        "python": platform.python_version(),
+        "machine": platform.node(),
+    }
+
+def load_history(results_folder=RESULTS_FOLDER) -> List[dict]:
+    """Reads every stored result (oldest first)."""
+    history_file = Path(results_folder) / HISTORY_FILE_NAME
+    if not history_file.exists():
+        return []
+    with open(history_file, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def append_results(results: List[dict], results_folder=RESULTS_FOLDER):
+    """Appends results to the history file."""
+    results_folder = Path(results_folder)
+    results_folder.mkdir(parents=True, exist_ok=True)
+    with open(results_folder / HISTORY_FILE_NAME, "a", encoding="utf-8") as f:
+        for result in results:
+            f.write(json.dumps(result) + "\n")
+
+def flag_regressions(result: dict, history: List[dict], threshold: float = REGRESSION_THRESHOLD) -> List[str]:
+    """
+    Compares a result with the median of the last BASELINE_RUNS runs of the
+    same benchmark, parameters and machine, and describes every metric that regressed.
+    """
+    previous = [
+        entry for entry in history
+        if entry["benchmark"] == result["benchmark"]
+        and entry["params"] == result["params"]
+        and entry.get("machine") == result.get("machine")
+    ][-BASELINE_RUNS:]
+    flags = []
+    for metric, value in result["metrics"].items():
+        baseline_values = [entry["metrics"][metric] for entry in previous if metric in entry["metrics"]]
+        if not baseline_values:
+            continue
+        baseline = float(np.median(baseline_values))
+        if baseline > 0 and value > baseline * (1 + threshold) and value - baseline >= REGRESSION_MIN_SECONDS:
+            flags.append(f"{metric}: {value:.3f}s vs baseline {baseline:.3f}s (+{value / baseline - 1:.0%})")
+    return flags
@@ -0,0 +1,113 @@
+"""
+Synthetic vw_VT_DailyEEHoursSummary workload and a SQLite stand-in for the view.
+
+synthetic_view_rows builds raw view rows with the column names DICT_COL_NAMES
+maps (plus the dimension columns), for a configurable number of employees and
+days and a configurable share of zero-productivity and gap-day employees.
+load_into_sqlite writes them to a SQLite table named like the view, so
+generate_query / load_data run unchanged against it.
+"""
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from tools.config import DICT_COL_NAMES, DIMENSION_COLUMNS
+from tools.connections import create_sqlalchemy_engine
+
+VIEW_NAME = "vw_VT_DailyEEHoursSummary"
+# How SQLAlchemy's SQLite dialect renders bound datetime parameters
+SQLITE_DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+# Raw hour columns of the view: name -> typical hours on a regular working day
+WORKDAY_HOURS = {
+    'Productive_Active': 5.0,
+    'Productive_Passive': 1.5,
+    'Undefined': 0.3,
+    'Unproductive': 0.7,
+}
+
+# Share of rows outside the report type 1 population (filtered out by the query)
+OUT_OF_POPULATION_SHARE = 0.05
+
+def synthetic_view_rows(
+    employees: int,
+    days: int,
+    zero_prod_share: float = 0.05,
+    gap_share: float = 0.15,
+    projects_per_day: int = 2,
+    start_date: str = "2026-01-04",
+    seed: int = 0,
+) -> pd.DataFrame:
+    """
+    Builds raw view rows: one row per (day, employee, project).
+
+    Zero-productivity employees log no productive hours at all; gap employees
+    have one or more weeks with a daily productive average below 2 hours;
+    everyone else works regular weekdays. Weekends are mostly empty and a
+    few percent of the employees are contractors, so the type 1
+    population filter has something to drop.
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(start_date, periods=days, freq="D")
+    eeids = np.array([f"{chr(ord('A') + i % 26)}{90000 + i // 26:05d}" for i in range(employees)])
+
+    kind = rng.choice(["regular", "zero", "gap"], size=employees, p=[1 - zero_prod_share - gap_share, zero_prod_share, gap_share])
+    # Report weeks start on Sunday
+    weeks = (np.arange(days) + (dates[0].dayofweek + 1) % 7) // 7
+    # Gap employees get a random low week
+    gap_week = rng.integers(0, weeks.max() + 1, size=employees)
+
+    rows = employees * days * projects_per_day
+    emp = np.repeat(np.arange(employees), days * projects_per_day)
+    day = np.tile(np.repeat(np.arange(days), projects_per_day), employees)
+    weekend = dates.dayofweek.to_numpy()[day] >= 5
+
+    factor = np.where(weekend, 0.0, 1.0 / projects_per_day)
+    factor = np.where(kind[emp] == "zero", 0.0, factor)
+    factor = np.where((kind[emp] == "gap") & (weeks[day] == gap_week[emp]), factor * 0.15, factor)
+
+    df = pd.DataFrame({
+        'AT_Date': dates[day].strftime(SQLITE_DATETIME_FORMAT),
+        'Employee_ID': eeids[emp],
+        'HOLHrs': np.where(rng.random(rows) < 0.01, 8.0 / projects_per_day, 0.0),
+        'PTOHrs': np.where(rng.random(rows) < 0.02, 8.0 / projects_per_day, 0.0),
+    })
+    for col, hours in WORKDAY_HOURS.items():
+        df[col] = np.round(rng.gamma(4.0, hours / 4.0, rows) * factor, 2)
+    # The view returns NULL rather than 0 for some hour columns
+    df.loc[rng.random(rows) < 0.1, 'Undefined'] = np.nan
+
+    df['AT_UserName'] = np.char.add("user.", eeids[emp].astype(str))
+    df['FName'] = np.char.add("First", eeids[emp].astype(str))
+    df['LName'] = "Synthetic"
+    out_of_population = rng.random(employees) < OUT_OF_POPULATION_SHARE
+    df['EmployeeTypeDescription'] = np.where(out_of_population[emp], "Contractor", "Full-time")
+    df['EmployeeStatusDescription'] = "Active"
+    df['Title'] = rng.choice(["Developer", "Analyst", "Agent", "Team Lead"], employees)[emp]
+    projects = np.array([f"{code} Project {code}" for code in (2100, 2200, 2300, 2400, 4100)])
+    df['Company Project Code Desc Only'] = projects[(emp + day % projects_per_day) % len(projects)]
+    df['Location'] = rng.choice(["Colombia", "Guatemala", "Mexico", "Argentina"], employees)[emp]
+    df['Reports_To'] = np.char.add("Manager ", (np.arange(employees) // 25).astype(str))[emp]
+    return df[list(DICT_COL_NAMES) + DIMENSION_COLUMNS]
+
+def load_into_sqlite(df: pd.DataFrame, database_path):
+    """
+    Writes the rows to a fresh SQLite database as the vw_VT_DailyEEHoursSummary
+    table and returns a pooled engine for it (see connections.create_sqlalchemy_engine).
+
+    AT_Date is stored as text in the format SQLAlchemy binds datetimes with
+    on SQLite, so generate_query's BETWEEN :start_date AND :end_date compares
+    like SQL Server's dates do.
+    """
+    database_path = Path(database_path)
+    database_path.unlink(missing_ok=True)
+    engine = create_sqlalchemy_engine(f"sqlite:///{database_path.resolve()}")
+    with engine.begin() as conn:
+        df.to_sql(VIEW_NAME, conn, index=False, chunksize=50000)
+        conn.execute(text(f"CREATE INDEX ix_view_date ON {VIEW_NAME} (AT_Date)"))
+    return engine
+
+def date_span(df: pd.DataFrame):
+    """Returns the (first, last) AT_Date of the rows as timestamps."""
+    dates = pd.to_datetime(df['AT_Date'])
+    return dates.min(), dates.max()
@@ -2,11 +2,10 @@
 Export data from VT
 """
 import pandas as pd
-from tools.config import EMPLOYEE_IDS
-from tools.connections import alchemy_connection
-from tools.dataprocessing import load_data, preprocess_data, generate_gapdays_missingprod_reports, generate_productivity_reports
+from tools.connections import alchemy_connection, dispose_engines
+from tools.dataprocessing import generate_query, load_data, preprocess_data, generate_gapdays_missingprod_reports, generate_productivity_reports
 
-def export_data(query, start_date, end_date):
+def export_data(start_date, end_date):
     """Main function to run the report generation"""
     output_folder_path = '/Users/Estiben.Gonzalez/Downloads/Daily_AT_Report/GapDaysReports/app/data/output/exported_data/'
     
@@ -14,6 +13,8 @@ def export_data(query, start_date, end_date):
     conn = None
     try:
         conn = alchemy_connection()
+        # The EMPLOYEE_IDS population of the productivity report, with bound dates and EEIDs
+        query = generate_query(report_type=3, start_date=start_date, end_date=end_date, conn=conn)
         df = load_data(conn, query)
         preprocessed_df = preprocess_data(df)
         preprocessed_df.to_csv(f"{output_folder_path}Data_Export_{start_date}_{end_date}", index=False)
@@ -29,13 +30,10 @@ def export_data(query, start_date, end_date):
             except Exception:
                 # Avoid masking the original exception
                 pass
+        # Release the pooled connections held by this process
+        dispose_engines()
 
 if __name__ == "__main__":
     inputed_start_date = input("Enter the start date (YYYY-MM-DD): ")
     inputed_end_date = input("Enter the end date (YYYY-MM-DD): ")
-
-    query = f"""SELECT * FROM vw_VT_DailyEEHoursSummary
-            WHERE AT_Date BETWEEN '{inputed_start_date}' AND '{inputed_end_date}'
-            AND Employee_ID IN ({','.join(f"'{key}'" for key in EMPLOYEE_IDS.keys())});
-            """
-    export_data(query, inputed_start_date, inputed_end_date)
+    export_data(inputed_start_date, inputed_end_date)
@@ -1,28 +1,47 @@
 """
 Main script to generate GapDays report
 """
-from tools.connections import alchemy_connection
-from tools.dataprocessing import generate_query, load_data, preprocess_data, generate_gapdays_missingprod_reports, generate_productivity_reports
+from tools.config import SERVER_SIDE_AGGREGATION, USE_EXTRACT_CACHE, LEAN_PREPROCESSING, EXTRACT_SPLIT
+from tools.connections import alchemy_connection, dispose_engines
+from tools.extract_cache import load_data_cached
+from tools.partitioned_extract import load_data_partitioned
+from tools.profiling import print_stage_summary, write_run_report
+from tools.dataprocessing import prompt_date_range, generate_query, load_data, preprocess_data, preprocess_data_lean, generate_gapdays_missingprod_reports, generate_productivity_reports, generate_multi_reports
 
 def main():
     """Main function to run the report generation"""
-    input_folder_path = '/Users/Estiben.Gonzalez/Downloads/Daily_AT_Report/GapDaysReports/app/data/input/'
     output_folder_path = '/Users/Estiben.Gonzalez/Downloads/Daily_AT_Report/GapDaysReports/app/data/output/'
     
     print("Generating GapDays report...")
     conn = None
     try:
-        # Fix: remove .lower() before int()
-        report_type = int(input("Enter report type (gap_days: 1. productivity: 3): ").strip())
+        # "1,3" runs both reports from a single data pull
+        report_types = [int(t) for t in input("Enter report type (gap_days: 1. productivity: 3. both: 1,3): ").replace(" ", "").split(",")]
+        report_type = report_types if len(report_types) > 1 else report_types[0]
         conn = alchemy_connection()
-        query = generate_query(report_type=report_type)
-        df = load_data(conn, query)
+        start_date, end_date = prompt_date_range()
+        if USE_EXTRACT_CACHE:
+            df = load_data_cached(conn, report_type, start_date, end_date, aggregate=SERVER_SIDE_AGGREGATION, lean=LEAN_PREPROCESSING)
+        elif EXTRACT_SPLIT:
+            # Slices of the range fetched concurrently over the pooled connections
+            df = load_data_partitioned(conn.engine, report_type, start_date, end_date, aggregate=SERVER_SIDE_AGGREGATION, lean=LEAN_PREPROCESSING)
+        else:
+            query = generate_query(report_type=report_type, start_date=start_date, end_date=end_date, aggregate=SERVER_SIDE_AGGREGATION, conn=conn)
+            df = load_data(conn, query, lean=LEAN_PREPROCESSING)
         print(df.head())
-        preprocessed_df = preprocess_data(df)
-        if report_type == 1:
-            generate_gapdays_missingprod_reports(preprocessed_df, input_folder_path, output_folder_path)
+        dimensions = None
+        if LEAN_PREPROCESSING:
+            # Descriptive columns live in a per-EEID table instead of on every daily row
+            preprocessed_df, dimensions = preprocess_data_lean(df, aggregated=SERVER_SIDE_AGGREGATION)
+        else:
+            preprocessed_df = preprocess_data(df, aggregated=SERVER_SIDE_AGGREGATION)
+        del df
+        if len(report_types) > 1:
+            generate_multi_reports(preprocessed_df, report_types, output_folder_path, dimensions=dimensions)
+        elif report_type == 1:
+            generate_gapdays_missingprod_reports(preprocessed_df, output_folder_path, dimensions=dimensions)
         elif report_type == 3:
-            generate_productivity_reports(preprocessed_df, input_folder_path, output_folder_path)
+            generate_productivity_reports(preprocessed_df, output_folder_path, dimensions=dimensions)
         print("Report successfully generated")
     except Exception as e:
         print(f"Error generating report: {str(e)}")
@@ -35,6 +54,15 @@ def main():
             except Exception:
                 # Avoid masking the original exception
                 pass
+        # Release the pooled connections held by this process
+        dispose_engines()
+        # Where the run spent its time, also for runs that failed half way
+        print_stage_summary()
+        try:
+            print(f"Run report saved to {write_run_report(f'{output_folder_path}run_reports/')}")
+        except Exception as e:
+            # Avoid masking the original exception
+            print(f"Could not save the run report: {str(e)}")
 
 if __name__ == "__main__":
     main()
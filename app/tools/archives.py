@@ -0,0 +1,201 @@
+"""
+Zip archives of the report folders.
+
+Files that are already compressed (PNG, JPEG, WebP, PDF, ...) are stored as
+they are; only text files such as the CSV datasets are deflated. Archives
+are updated incrementally: every entry records the size and modification
+time (ns) of its file in its zip comment, files that still match their
+entry are left alone, new files are appended and an archive is only
+rebuilt when one of its files changed or disappeared.
+
+An archive can be split into one part per manager (from the EEIDs of the
+reports manifests and the employee directory) or into parts of at most
+ARCHIVE_MAX_MB of input. Files keep the size part they were archived in,
+so a new file never moves others into a different part. The parts are built in parallel by ARCHIVE_WORKERS
+threads; zlib and the file reads release the GIL.
+"""
+import json
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List
+from tools.config import ARCHIVE_WORKERS, ARCHIVE_COMPRESS_LEVEL, ARCHIVE_MAX_MB
+from tools.employee_directory import load_directory_cache, lookup_reports_to
+from tools.profiling import stage
+from tools.report_manifest import MANIFEST_FILE_NAME
+from tools.utils import safe_file_name
+
+# Formats that deflate cannot shrink any further
+STORED_SUFFIXES = {".png", ".jpg", ".jpeg", ".webp", ".pdf", ".zip", ".gz", ".parquet", ".xlsx"}
+
+# Splits of an archive: one part per manager or parts of at most ARCHIVE_MAX_MB
+ARCHIVE_SPLITS = ("manager", "size")
+
+# Part of the manager split holding the files of no particular employee (datasets, batch PDFs, ...)
+SHARED_PART_NAME = "Shared"
+
+def compress_type(path) -> int:
+    """ZIP_STORED for already compressed formats, ZIP_DEFLATED otherwise."""
+    return zipfile.ZIP_STORED if Path(path).suffix.lower() in STORED_SUFFIXES else zipfile.ZIP_DEFLATED
+
+def file_stamp(path) -> bytes:
+    """Size and modification time of a file, as stored in the comment of its zip entry."""
+    stat = Path(path).stat()
+    return f"{stat.st_size}:{stat.st_mtime_ns}".encode("ascii")
+
+def archive_files(folder) -> List[Path]:
+    """Files to archive under folder, in a stable order; hidden files (the manifests) and temporary files are skipped."""
+    folder = Path(folder)
+    return sorted(
+        path for path in folder.rglob("*")
+        if path.is_file()
+        and not any(part.startswith(".") for part in path.relative_to(folder).parts)
+        and path.suffix != ".tmp"
+    )
+
+def file_managers(folder) -> Dict[Path, str]:
+    """Maps the report files of the manifests under folder to the Reports_To of their EEID."""
+    cache = load_directory_cache()
+    managers = {}
+    for manifest_file in Path(folder).rglob(MANIFEST_FILE_NAME):
+        try:
+            with open(manifest_file, encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for eeid, entry in manifest.items():
+            manager = lookup_reports_to(eeid) or cache.get(eeid, {}).get("reports_to")
+            managers[(manifest_file.parent / entry["file"]).resolve()] = manager or "No Manager"
+    return managers
+
+def plan_archives(folder, output_path, split: str = None, max_mb: float = None) -> Dict[Path, List[Path]]:
+    """
+    Decides which files of folder go into which archive (archive path -> files).
+
+    With the size split, files already in a part stay in it and new files go
+    into the last part while it has room, then into new parts.
+    """
+    output_path = Path(output_path)
+    # The archive and its parts may live inside folder
+    output_folder = output_path.parent.resolve()
+    files = [
+        path for path in archive_files(folder)
+        if not (path.parent.resolve() == output_folder and path.name.startswith(output_path.stem) and path.suffix == output_path.suffix)
+    ]
+    if split is None:
+        return {output_path: files}
+    if split not in ARCHIVE_SPLITS:
+        raise ValueError(f"Unknown archive split '{split}'. Available: {', '.join(ARCHIVE_SPLITS)}")
+
+    parts: Dict[Path, List[Path]] = {}
+    if split == "manager":
+        managers = file_managers(folder)
+        for path in files:
+            name = safe_file_name(managers.get(path.resolve(), SHARED_PART_NAME))
+            parts.setdefault(output_path.with_name(f"{output_path.stem} - {name}{output_path.suffix}"), []).append(path)
+        return parts
+
+    # Files already archived stay in their part; new files fill the last part, then new ones
+    by_arcname = {path.relative_to(folder).as_posix(): path for path in files}
+    placed = set()
+    for part_path, arcnames in size_part_entries(output_path).items():
+        parts[part_path] = [by_arcname[arcname] for arcname in arcnames if arcname in by_arcname and arcname not in placed]
+        placed.update(arcnames)
+    part = len(parts) or 1
+    part_bytes = sum(path.stat().st_size for path in parts.get(size_part_path(output_path, part), []))
+    max_bytes = (max_mb if max_mb is not None else ARCHIVE_MAX_MB) * 1024 * 1024
+    for arcname, path in by_arcname.items():
+        if arcname in placed:
+            continue
+        size = path.stat().st_size
+        if part_bytes and max_bytes > 0 and part_bytes + size > max_bytes:
+            part, part_bytes = part + 1, 0
+        parts.setdefault(size_part_path(output_path, part), []).append(path)
+        part_bytes += size
+    return parts
+
+def size_part_path(output_path: Path, part: int) -> Path:
+    """Path of a part of the size split (numbered from 1)."""
+    return output_path.with_name(f"{output_path.stem}_part{part:03d}{output_path.suffix}")
+
+def size_part_entries(output_path: Path) -> Dict[Path, List[str]]:
+    """
+    Entry names of the size parts already written next to output_path, from
+    part 1 up to the first missing part. An unreadable part (an interrupted
+    run) is planned from scratch.
+    """
+    entries = {}
+    part = 1
+    while size_part_path(output_path, part).exists():
+        part_path = size_part_path(output_path, part)
+        try:
+            with zipfile.ZipFile(part_path) as zipf:
+                entries[part_path] = zipf.namelist()
+        except zipfile.BadZipFile:
+            entries[part_path] = []
+        part += 1
+    return entries
+
+def update_archive(archive_path, folder, files: List[Path], compresslevel: int = None) -> dict:
+    """
+    Brings archive_path up to date with files (stored relative to folder).
+
+    Entries whose stamp (file_stamp) matches their file are kept and new
+    files are appended; if a file changed or an entry has no file any
+    more, the archive is written again. Returns the counts of the update.
+    """
+    archive_path = Path(archive_path)
+    compresslevel = ARCHIVE_COMPRESS_LEVEL if compresslevel is None else compresslevel
+    planned = {path.relative_to(folder).as_posix(): path for path in files}
+    stamps = {arcname: file_stamp(path) for arcname, path in planned.items()}
+
+    existing = {}
+    if archive_path.exists():
+        try:
+            with zipfile.ZipFile(archive_path) as zipf:
+                existing = {info.filename: info for info in zipf.infolist()}
+        except zipfile.BadZipFile:
+            # A half-written archive from an interrupted run
+            existing = None
+    rebuild = existing is None or any(info.comment != stamps.get(arcname) for arcname, info in existing.items())
+    new = list(planned) if rebuild else [arcname for arcname in planned if arcname not in existing]
+    if not new and not rebuild:
+        return {"archive": str(archive_path), "added": 0, "kept": len(existing), "rebuilt": False}
+
+    archive_path.parent.mkdir(parents=True, exist_ok=True)
+    target = archive_path.with_name(f"{archive_path.name}.tmp") if rebuild else archive_path
+    try:
+        with zipfile.ZipFile(target, "w" if rebuild else "a", compresslevel=compresslevel) as zipf:
+            for arcname in new:
+                zipf.write(planned[arcname], arcname, compress_type=compress_type(arcname))
+                # Only kept in the central directory, which is written on close
+                zipf.getinfo(arcname).comment = stamps[arcname]
+        if rebuild:
+            target.replace(archive_path)
+    except BaseException:
+        if rebuild:
+            target.unlink(missing_ok=True)
+        raise
+    return {"archive": str(archive_path), "added": len(new), "kept": 0 if rebuild else len(existing), "rebuilt": rebuild}
+
+def build_archives(folder, output_path, split: str = None, max_mb: float = None, workers: int = None, compresslevel: int = None) -> List[dict]:
+    """
+    Archives folder into output_path, or into parts next to it with split
+    ("manager" or "size", see plan_archives). Parts are updated in parallel
+    (update_archive); returns the result of every part.
+    """
+    folder = Path(folder)
+    workers = ARCHIVE_WORKERS if workers is None else workers
+    parts = plan_archives(folder, output_path, split, max_mb)
+
+    def build(item):
+        archive_path, files = item
+        with stage("archive", part=archive_path.name, files=len(files)):
+            return update_archive(archive_path, folder, files, compresslevel)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        results = list(executor.map(build, parts.items()))
+    added = sum(result["added"] for result in results)
+    rebuilt = sum(result["rebuilt"] for result in results)
+    print(f"Archived {folder} into {len(results)} archive(s): {added} files written, {rebuilt} archive(s) rebuilt.")
+    return results
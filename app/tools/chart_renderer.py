@@ -0,0 +1,96 @@
+"""
+Chart rendering service for the plotly charts.
+
+Keeps one warm Kaleido/Chromium session alive for the whole run and renders
+figures in batches (e.g. every chart of a user) instead of paying the
+serialisation and renderer start-up cost on each fig.write_image call.
+Kaleido only batches file writes, so figures wanted in memory are written
+to a temporary folder in the same batch and read back.
+"""
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Optional, Sequence, Union
+import plotly.io as pio
+
+try:
+    import kaleido
+except ImportError:
+    kaleido = None
+
+# kaleido >= 1.0 exposes a persistent sync server and plotly >= 6.1 its batched writer
+_HAS_SYNC_SERVER = hasattr(kaleido, "start_sync_server")
+_HAS_BATCH_WRITER = _HAS_SYNC_SERVER and hasattr(pio, "write_images")
+
+_RENDERER_STARTED = False
+_STATS = {"figures": 0, "batches": 0, "seconds": 0.0}
+
+def start_renderer():
+    """Starts the warm Kaleido session used by every render call of this process."""
+    global _RENDERER_STARTED
+    if _RENDERER_STARTED:
+        return
+    if _HAS_SYNC_SERVER:
+        kaleido.start_sync_server(silence_warnings=True)
+    # kaleido 0.2.x keeps its renderer subprocess alive after the first call by itself
+    _RENDERER_STARTED = True
+
+def stop_renderer():
+    """Stops the warm Kaleido session."""
+    global _RENDERER_STARTED
+    if _RENDERER_STARTED and _HAS_SYNC_SERVER:
+        kaleido.stop_sync_server(silence_warnings=True)
+    _RENDERER_STARTED = False
+
+def render_figures(
+    figures: Sequence,
+    targets: Sequence[Optional[Union[str, Path]]],
+    widths: Union[int, Sequence[int]],
+    heights: Union[int, Sequence[int]],
+    scale: Union[float, Sequence[float]] = 2,
+    image_format: str = "png",
+    batched: bool = True,
+) -> List[Optional[bytes]]:
+    """
+    Renders a batch of plotly figures.
+
+    Each figure is written to its target path, or returned as bytes when its
+    target is None. Batched, every figure goes through one write_images call
+    on the warm session (when kaleido and plotly provide it). With
+    batched=False every figure goes through its own write_image/to_image
+    call, which is how the charts used to be rendered.
+    widths, heights and scale take one value for all figures or one per figure.
+    """
+    count = len(figures)
+    widths = list(widths) if isinstance(widths, (list, tuple)) else [widths] * count
+    heights = list(heights) if isinstance(heights, (list, tuple)) else [heights] * count
+    scales = list(scale) if isinstance(scale, (list, tuple)) else [scale] * count
+    start_time = time.perf_counter()
+    if batched:
+        start_renderer()
+
+    outputs: List[Optional[bytes]] = [None] * count
+    if batched and _HAS_BATCH_WRITER and count:
+        with tempfile.TemporaryDirectory(prefix="charts_") as folder:
+            paths = [Path(target) if target is not None else Path(folder) / f"{i}.{image_format}" for i, target in enumerate(targets)]
+            pio.write_images(figures, [str(path) for path in paths], format=image_format, scale=scales, width=widths, height=heights)
+            for i, target in enumerate(targets):
+                if target is None:
+                    outputs[i] = paths[i].read_bytes()
+        _STATS["batches"] += 1
+    else:
+        for i, target in enumerate(targets):
+            if target is None:
+                outputs[i] = pio.to_image(figures[i], format=image_format, width=widths[i], height=heights[i], scale=scales[i])
+            else:
+                pio.write_image(figures[i], str(target), format=image_format, width=widths[i], height=heights[i], scale=scales[i])
+
+    _STATS["figures"] += count
+    _STATS["seconds"] += time.perf_counter() - start_time
+    return outputs
+
+def renderer_stats() -> dict:
+    """Returns the number of figures rendered by this process, how many write_images batches they took and the time per figure."""
+    stats = dict(_STATS)
+    stats["seconds_per_figure"] = stats["seconds"] / stats["figures"] if stats["figures"] else 0.0
+    return stats
@@ -2,6 +2,8 @@
 """
 Configuration module for charts
 """
+import os
+from pathlib import Path
 import matplotlib.patches as mpatches
 
 DICT_COL_NAMES = {
@@ -31,6 +33,115 @@ CHART_COLUMNS = ['Productive Active Hours', 'Productive Passive Hours', 'Holiday
 # Generate legend patches
 LEGEND_PATCHES = [mpatches.Patch(color=c, label=p) for p, c in PROD_COLORS.items()]
 
+# Local cache locations
+CACHE_FOLDER_PATH = Path(os.getenv("GAPDAYS_CACHE_DIR", Path(__file__).resolve().parents[1] / "data" / "cache"))
+DIRECTORY_CACHE_FILE = CACHE_FOLDER_PATH / "employee_directory.json"
+DIRECTORY_CACHE_MAX_AGE_DAYS = 7
+# Parquet extracts of the view, partitioned by AT_Date (see tools.extract_cache)
+USE_EXTRACT_CACHE = os.getenv("USE_EXTRACT_CACHE", "0").strip().lower() in ("1", "true", "yes")
+EXTRACT_CACHE_PATH = CACHE_FOLDER_PATH / "extracts"
+# Days are re-fetched until they were cached this many days after the fact (late hour corrections)
+EXTRACT_CACHE_SETTLE_DAYS = int(os.getenv("EXTRACT_CACHE_SETTLE_DAYS", "3"))
+# Partitions not fetched or read for this many days are evicted
+EXTRACT_CACHE_RETENTION_DAYS = int(os.getenv("EXTRACT_CACHE_RETENTION_DAYS", "180"))
+
+# Concurrent extraction of the view in slices (see tools.partitioned_extract)
+# Slices fetched in parallel: day, week (Sunday to Saturday) or eeid (hash buckets of Employee_ID); empty = one query
+EXTRACT_SPLIT = os.getenv("EXTRACT_SPLIT", "").strip().lower()
+# Slices running at the same time, one pooled connection each (keep within DB_POOL_SIZE + DB_POOL_MAX_OVERFLOW)
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", "4"))
+# Number of hash buckets of the eeid split
+EXTRACT_EEID_BUCKETS = int(os.getenv("EXTRACT_EEID_BUCKETS", "8"))
+
+# Per-employee descriptive columns of vw_VT_DailyEEHoursSummary kept through the daily rollup
+DIMENSION_COLUMNS = [
+    'AT_UserName',
+    'FName',
+    'LName',
+    'EmployeeTypeDescription',
+    'EmployeeStatusDescription',
+    'Title',
+    'Company Project Code Desc Only',
+    'Location',
+    'Reports_To',
+]
+PRODUCTIVE_ONLY_COLUMNS = ['Productive Active Hours', 'Productive Passive Hours', 'Undefined Hours', 'Unproductive Hours']
+
+# Data loading
+# Rows fetched per round trip when streaming query results
+LOAD_BATCH_SIZE = int(os.getenv("LOAD_BATCH_SIZE", "50000"))
+# Dtypes declared up front for the hour columns of vw_VT_DailyEEHoursSummary
+RAW_HOUR_COLUMNS = [raw for raw, name in DICT_COL_NAMES.items() if name in CHART_COLUMNS]
+RAW_HOUR_DTYPE = "float64"
+# Memory-lean frames (preprocess_data_lean): float32 hours, Arrow strings while loading and
+# the dimension columns in a per-EEID table instead of on every daily row
+LEAN_PREPROCESSING = os.getenv("LEAN_PREPROCESSING", "0").strip().lower() in ("1", "true", "yes")
+LEAN_HOUR_DTYPE = "float32"
+LEAN_STRING_DTYPE = "string[pyarrow]"
+# dtype of the columns of the per-EEID dimension table: "category" or "string[pyarrow]"
+DIMENSION_DTYPE = os.getenv("DIMENSION_DTYPE", "category")
+# Compute the daily per-EEID rollup in SQL Server instead of in preprocess_data
+SERVER_SIDE_AGGREGATION = os.getenv("SERVER_SIDE_AGGREGATION", "0").strip().lower() in ("1", "true", "yes")
+# Project codes (prefixes) excluded from the gap days population
+EXCLUDED_PROJECT_PREFIXES = ['1000', '1050', '3300', '8600']
+# EEID filters longer than this go through a temp table instead of one bound parameter per EEID
+# (SQL Server accepts at most 2100 parameters per statement)
+EEID_TEMP_TABLE_THRESHOLD = int(os.getenv("EEID_TEMP_TABLE_THRESHOLD", "500"))
+# Population flag columns of a multi-report pull (In_Population_1, In_Population_3, ...)
+POPULATION_FLAG_PREFIX = "In_Population_"
+
+# Report rendering
+# Number of worker processes used to render the per-user reports (1 = sequential; PDF reports are always sequential)
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", "1"))
+# Bump when the report template or charts change, so existing reports are rendered again
+RENDERER_VERSION = "4"
+# Chart backend: "plotly" (plotly + kaleido) or "matplotlib" (Agg, no Chromium).
+# PDF reports always draw their charts with the matplotlib chart code, whatever the backend
+CHART_BACKEND = os.getenv("CHART_BACKEND", "plotly")
+# Resampling filter of the leftover chart resizes in the report: nearest, box, bilinear, hamming, bicubic (quality) or lanczos (slowest)
+REPORT_RESAMPLING = os.getenv("REPORT_RESAMPLING", "bicubic")
+# Downscales by more than this factor first shrink with the fast Image.reduce (0 = always resample at full size)
+REPORT_REDUCING_GAP = float(os.getenv("REPORT_REDUCING_GAP", "2.0"))
+
+# Report output (see tools.report_encoding)
+# File format of the reports: png (lossless), webp, jpeg or pdf (vector pages, see tools.pdf_report_generator)
+REPORT_FORMAT = os.getenv("REPORT_FORMAT", "png").strip().lower()
+# zlib level of the PNG reports: 1 (fastest) to 9 (smallest); Pillow's default is 6
+PNG_COMPRESS_LEVEL = int(os.getenv("PNG_COMPRESS_LEVEL", "6"))
+# Search the smallest PNG encoding (implies level 9, several times slower)
+PNG_OPTIMIZE = os.getenv("PNG_OPTIMIZE", "0").strip().lower() in ("1", "true", "yes")
+# Quality (0-100) and effort (0 fastest - 6 smallest) of the WebP reports
+WEBP_QUALITY = int(os.getenv("WEBP_QUALITY", "90"))
+WEBP_METHOD = int(os.getenv("WEBP_METHOD", "4"))
+# Quality (0-95) of the JPEG reports
+JPEG_QUALITY = int(os.getenv("JPEG_QUALITY", "90"))
+# PDF reports: one file per employee, per manager or for the whole batch. PDFs are
+# always written again (no incremental manifest) and multi-report runs do not share their charts
+PDF_GROUPING = os.getenv("PDF_GROUPING", "manager").strip().lower()
+# Threads encoding reports in the background while the next user renders (0 = encode inline).
+# Only pays off with a spare core: on a single core the encodes slow the chart rendering down
+ENCODE_THREADS = int(os.getenv("ENCODE_THREADS", str(min(2, (os.cpu_count() or 1) - 1))))
+
+# Report archives (see tools.archives)
+# Threads building archive parts in parallel
+ARCHIVE_WORKERS = int(os.getenv("ARCHIVE_WORKERS", "4"))
+# zlib level of the deflated (text) files; images and PDFs are stored as they are
+ARCHIVE_COMPRESS_LEVEL = int(os.getenv("ARCHIVE_COMPRESS_LEVEL", "6"))
+# Input size of each part when splitting archives by size (0 = no limit)
+ARCHIVE_MAX_MB = float(os.getenv("ARCHIVE_MAX_MB", "500"))
+
+# Profiling
+# Also trace Python allocations per stage with tracemalloc (slows the run down)
+PROFILE_MEMORY = os.getenv("PROFILE_MEMORY", "0").strip().lower() in ("1", "true", "yes")
+
+# CSV datasets
+# Status columns: column -> (label of the flagged users, label of everyone else)
+STATUS_LABELS = {
+    'Gap_Status': ('Gap', 'No Gap'),
+    'Missing_Prod_Status': ('Missing Prod', 'Has Prod'),
+}
+DATASET_COLUMNS = ['Date', 'Week', 'EEID', 'AT_UserName', 'FName', 'LName', 'EmployeeTypeDescription', 'Title', 'Company Project Code Desc Only', 'Location', 'Reports_To']
+
 # ID-s to review
 
 EMPLOYEE_IDS = {
@@ -1,7 +1,9 @@
 """Script witht the functions to connect the data base"""
 import os
+import threading
 import pyodbc
 from sqlalchemy import create_engine
+from sqlalchemy.pool import QueuePool
 
 # Load environment variables
 try:
@@ -16,6 +18,12 @@ def env_get_int(name: str, default: int) -> int:
     except (TypeError, ValueError):
         return default
 
+def env_get_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
 def connection_string_builder():
     """Builds the connection string for the database."""
     server = os.getenv("DB_SERVER")
@@ -86,23 +94,79 @@ def engine_connection_string_builder():
     )
     return connection_string
 
-def create_sqlalchemy_engine(connection_string=None):
+def pool_settings():
+    """Reads the QueuePool settings for the shared engine from the environment."""
+    return {
+        "pool_size": env_get_int("DB_POOL_SIZE", 5),
+        "max_overflow": env_get_int("DB_POOL_MAX_OVERFLOW", 10),
+        "pool_timeout": env_get_int("DB_POOL_TIMEOUT", 30),
+        "pool_recycle": env_get_int("DB_POOL_RECYCLE", 1800),
+        "pool_pre_ping": env_get_bool("DB_POOL_PRE_PING", True),
+    }
+
+def create_sqlalchemy_engine(connection_string=None, **pool_kwargs):
     """Creates a SQLAlchemy engine for the database connection."""
     if connection_string is None:
         connection_string = engine_connection_string_builder()
     try:
-        engine = create_engine(connection_string, fast_executemany=True)
+        if connection_string.startswith("mssql"):
+            engine = create_engine(connection_string, fast_executemany=True, poolclass=QueuePool, **pool_kwargs)
+        else:
+            engine = create_engine(connection_string, **pool_kwargs)
         return engine
     except Exception as e:
         print("❌ SQLAlchemy engine connection failed.")
         print("Error details:", e)
         return None
 
+# ---- Process-wide engine registry ----
+# One lazily created, pooled engine per connection string. Engines are owned by
+# the process that created them; a forked child never reuses its parent's sockets.
+_ENGINES = {}
+_ENGINES_PID = os.getpid()
+_ENGINES_LOCK = threading.Lock()
+
+def _reset_engines_after_fork():
+    """Drops inherited engines in a forked child without closing the parent's connections."""
+    global _ENGINES_LOCK, _ENGINES_PID
+    _ENGINES_LOCK = threading.Lock()
+    for engine in _ENGINES.values():
+        engine.dispose(close=False)
+    _ENGINES.clear()
+    _ENGINES_PID = os.getpid()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_engines_after_fork)
+
+def get_engine(connection_string=None):
+    """Returns the shared pooled engine for the connection string, creating it on first use."""
+    if connection_string is None:
+        connection_string = engine_connection_string_builder()
+    if _ENGINES_PID != os.getpid():
+        # Started through a path that skipped the fork hook
+        _reset_engines_after_fork()
+    engine = _ENGINES.get(connection_string)
+    if engine is None:
+        with _ENGINES_LOCK:
+            engine = _ENGINES.get(connection_string)
+            if engine is None:
+                settings = pool_settings() if connection_string.startswith("mssql") else {}
+                engine = create_sqlalchemy_engine(connection_string, **settings)
+                if engine is not None:
+                    _ENGINES[connection_string] = engine
+    return engine
+
+def dispose_engines():
+    """Closes every pooled connection owned by this process."""
+    with _ENGINES_LOCK:
+        for engine in _ENGINES.values():
+            engine.dispose()
+        _ENGINES.clear()
+
 def alchemy_connection(engine=None):
-    """Establishes a connection using SQLAlchemy engine."""
+    """Checks out a connection from the shared pooled engine (or the given engine)."""
     if engine is None:
-        connection_string = engine_connection_string_builder()
-        engine = create_sqlalchemy_engine(connection_string)
+        engine = get_engine()
     try:
         conn = engine.connect()
         return conn
@@ -112,6 +176,4 @@ def alchemy_connection(engine=None):
         return None
 
 if __name__ == "__main__":
-    connection_string = engine_connection_string_builder()
-    engine = create_sqlalchemy_engine(connection_string)
-    conn = alchemy_connection(engine)
+    conn = alchemy_connection()
@@ -1,21 +1,30 @@
 """Data processing utilities for the GapDaysReports application.
 """
 import os
+import tempfile
 import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import pandas as pd
 import numpy as np
-from sqlalchemy import text
-from tools.utils import eeids_reports_cache
+from sqlalchemy import bindparam, text
+from sqlalchemy.sql.elements import TextClause
+from typing import Iterator
+from tools.utils import peak_rss_mb, safe_file_name
+from tools.profiling import stage, record_user_time, drain_records, merge_records, background_encodes
+from tools.report_manifest import fingerprint_user, load_manifest, save_manifest, is_up_to_date, record_report
 from tools.connections import alchemy_connection
-from tools.generate_charts import weekly_bar_chart, daily_bar_chart
-from tools.png_report_generator import generate_png_report
+from tools.employee_directory import load_employee_directory, lookup_user_name, lookup_reports_to, update_directory
+from tools.generate_charts import user_chart_images, shared_user_chart_images, report_chart_slots, set_chart_backend, get_chart_backend
+from tools.chart_renderer import start_renderer, stop_renderer, renderer_stats
+from tools.png_report_generator import compose_png_report
+from tools.report_encoding import report_suffix, wait_for_encodes
+from tools.pdf_report_generator import PDF_GROUPINGS, write_pdf_report
 from pathlib import Path
-from tools.config import DICT_COL_NAMES, CHART_COLUMNS, EMPLOYEE_IDS
+from tools.config import DICT_COL_NAMES, CHART_COLUMNS, DIMENSION_COLUMNS, PRODUCTIVE_ONLY_COLUMNS, EMPLOYEE_IDS, REPORT_WORKERS, LOAD_BATCH_SIZE, RAW_HOUR_COLUMNS, RAW_HOUR_DTYPE, STATUS_LABELS, DATASET_COLUMNS, POPULATION_FLAG_PREFIX, EXCLUDED_PROJECT_PREFIXES, EEID_TEMP_TABLE_THRESHOLD, REPORT_FORMAT, PDF_GROUPING, LEAN_HOUR_DTYPE, LEAN_STRING_DTYPE, DIMENSION_DTYPE
 from tqdm import tqdm
 
-def generate_query(report_type=1) -> str:
-    """Generates the SQL query to fetch data."""
-    # Read from the reporting view containing daily employee hours summary
+def prompt_date_range():
+    """Asks for the report date range and returns it as (start_date, end_date) timestamps."""
     inputed_start_date = input("Enter the start date (YYYY-MM-DD): ")
     inputed_end_date = input("Enter the end date (YYYY-MM-DD): ")
     try:
@@ -23,58 +32,405 @@ def generate_query(report_type=1) -> str:
         end_date = pd.to_datetime(inputed_end_date)
     except ValueError:
         raise ValueError("Invalid date format. Please enter the date in YYYY-MM-DD format.")
+    return start_date, end_date
+
+def report_filter(report_type=1, eeid_table=None):
+    """
+    Returns the population filter of a report type as (WHERE conditions besides
+    the dates, bound parameter values).
+
+    The conditions only use named parameters, so the statement text does not
+    change between runs and SQL Server reuses its plan. The EEIDs of the
+    productivity population are bound as a list (expanded to one parameter
+    each), or read from eeid_table when given (see load_eeid_table).
+    """
     if report_type == 1:
-        query = f"""SELECT * FROM vw_VT_DailyEEHoursSummary
-                    WHERE AT_Date BETWEEN '{start_date}' AND '{end_date}'
-                    AND EmployeeTypeDescription = 'Full-time'
-                    AND EmployeeStatusDescription = 'Active'
-                    AND [Company Project Code Desc Only] NOT LIKE '1000%'
-                    AND [Company Project Code Desc Only] NOT LIKE '1050%'
-                    AND [Company Project Code Desc Only] NOT LIKE '3300%'
-                    AND [Company Project Code Desc Only] NOT LIKE '8600%';
-                    """
+        excluded = [f"excluded_project_{i}" for i in range(len(EXCLUDED_PROJECT_PREFIXES))]
+        clause = "\n                    AND ".join(
+            ["EmployeeTypeDescription = :employee_type", "EmployeeStatusDescription = :employee_status"]
+            + [f"[Company Project Code Desc Only] NOT LIKE :{name}" for name in excluded]
+        )
+        params = {'employee_type': 'Full-time', 'employee_status': 'Active'}
+        params.update({name: f"{prefix}%" for name, prefix in zip(excluded, EXCLUDED_PROJECT_PREFIXES)})
+        return clause, params
     elif report_type == 3:
+        if eeid_table is not None:
+            return f"Employee_ID IN (SELECT Employee_ID FROM {eeid_table})", {}
+        return "Employee_ID IN :report_eeids", {'report_eeids': list(EMPLOYEE_IDS.keys())}
+    raise ValueError(f"Unknown report type: {report_type}")
+
+def report_population_key(report_type) -> str:
+    """Identifies the population of a report type (filter and parameter values), e.g. for cache keys."""
+    clause, params = report_filter(report_type)
+    return f"{clause}|{sorted(params.items())}"
+
+def eeid_table_name(conn) -> str:
+    """Name of the session temp table holding the EEID filter on this connection's database."""
+    return "#report_eeids" if conn.dialect.name == "mssql" else "temp_report_eeids"
+
+def load_eeid_table(conn, eeids) -> str:
+    """
+    Loads eeids into a session temp table on conn and returns its name.
+
+    The rows are inserted with a single executemany, which runs as one bulk
+    round trip on SQL Server (create_sqlalchemy_engine enables fast_executemany).
+    Queries that filter on the table must run on the same connection.
+    """
+    table = eeid_table_name(conn)
+    if conn.dialect.name == "mssql":
+        conn.execute(text(f"IF OBJECT_ID('tempdb..{table}') IS NOT NULL DROP TABLE {table}"))
+        conn.execute(text(f"CREATE TABLE {table} (Employee_ID VARCHAR(32) NOT NULL PRIMARY KEY)"))
+    else:
+        conn.execute(text(f"DROP TABLE IF EXISTS temp.{table}"))
+        conn.execute(text(f"CREATE TEMP TABLE {table} (Employee_ID VARCHAR(32) NOT NULL PRIMARY KEY)"))
+    conn.execute(text(f"INSERT INTO {table} (Employee_ID) VALUES (:eeid)"), [{'eeid': eeid} for eeid in dict.fromkeys(eeids)])
+    return table
+
+def population_filters(report_types, conn=None):
+    """
+    Returns {report_type: (conditions, params)} for the report types. EEID lists
+    longer than EEID_TEMP_TABLE_THRESHOLD go through a temp table on conn.
+    """
+    filters = {}
+    for report_type in report_types:
+        clause, params = report_filter(report_type)
+        eeids = params.get('report_eeids')
+        if eeids is not None and len(eeids) > EEID_TEMP_TABLE_THRESHOLD:
+            if conn is None:
+                raise ValueError(f"{len(eeids)} EEIDs need a temp table: pass the connection that will run the query.")
+            clause, params = report_filter(report_type, eeid_table=load_eeid_table(conn, eeids))
+        filters[report_type] = (clause, params)
+    return filters
+
+def bind_query(sql: str, params: dict) -> TextClause:
+    """Builds the statement with every value bound as a parameter (lists as expanding IN parameters)."""
+    return text(sql).bindparams(*[
+        bindparam(name, value=value, expanding=isinstance(value, (list, tuple)))
+        for name, value in params.items()
+    ])
+
+def date_params(start_date, end_date) -> dict:
+    """Bound values of the :start_date / :end_date parameters."""
+    return {'start_date': pd.Timestamp(start_date).to_pydatetime(), 'end_date': pd.Timestamp(end_date).to_pydatetime()}
+
+def aggregated_select_list() -> str:
+    """
+    SELECT list of the server-side daily rollup.
+
+    Sums the hour columns per (AT_Date, Employee_ID) under their report names,
+    derives Productive Only and Total Hours, and keeps one value (MAX) of each
+    dimension column per group.
+    """
+    raw_names = {name: raw for raw, name in DICT_COL_NAMES.items()}
+    hours = {col: f"COALESCE([{raw_names[col]}], 0)" for col in CHART_COLUMNS}
+    select = ["AT_Date AS [Date]", "Employee_ID AS [EEID]"]
+    select += [f"SUM({hours[col]}) AS [{col}]" for col in CHART_COLUMNS]
+    select.append(f"SUM({' + '.join(hours[col] for col in PRODUCTIVE_ONLY_COLUMNS)}) AS [Productive Only]")
+    select.append(f"SUM({' + '.join(hours[col] for col in CHART_COLUMNS)}) AS [Total Hours]")
+    select += [f"MAX([{col}]) AS [{col}]" for col in DIMENSION_COLUMNS]
+    return ",\n                    ".join(select)
+
+def is_multi_report(report_type) -> bool:
+    """True when report_type is a list/tuple of report types (one shared data pull)."""
+    return isinstance(report_type, (list, tuple))
+
+def generate_multi_report_query(report_types, start_date, end_date, aggregate=False, conn=None, slice_filter=None) -> TextClause:
+    """
+    Generates one query for the populations of several report types.
+
+    Raw rows come once, from the union of the populations, with one
+    In_Population_<type> flag (1/0) per report type. With aggregate=True every
+    population is rolled up separately (UNION ALL) and tagged with a Population
+    column. preprocess_data understands both shapes and split_populations then
+    returns one daily frame per report type.
+    """
+    filters = population_filters(report_types, conn)
+    params = date_params(start_date, end_date)
+    for _, filter_params in filters.values():
+        params.update(filter_params)
+    slice_clause = ""
+    if slice_filter is not None:
+        slice_clause = f"\n                    AND {slice_filter[0]}"
+        params.update(slice_filter[1])
+    if aggregate:
+        selects = [
+            f"""SELECT {report_type} AS [Population], {aggregated_select_list()}
+                    FROM vw_VT_DailyEEHoursSummary
+                    WHERE AT_Date BETWEEN :start_date AND :end_date
+                    AND {filters[report_type][0]}{slice_clause}
+                    GROUP BY AT_Date, Employee_ID"""
+            for report_type in report_types
+        ]
+        return bind_query("\n                    UNION ALL\n                    ".join(selects) + ";\n", params)
+    flags = ",\n                    ".join(
+        f"CASE WHEN ({filters[report_type][0]}) THEN 1 ELSE 0 END AS [{POPULATION_FLAG_PREFIX}{report_type}]"
+        for report_type in report_types
+    )
+    populations = " OR ".join(f"({filters[report_type][0]})" for report_type in report_types)
+    return bind_query(f"""SELECT *,
+                    {flags}
+                    FROM vw_VT_DailyEEHoursSummary
+                    WHERE AT_Date BETWEEN :start_date AND :end_date
+                    AND ({populations}){slice_clause};
+                    """, params)
+
+def generate_query(report_type=1, start_date=None, end_date=None, aggregate=False, conn=None, slice_filter=None) -> TextClause:
+    """
+    Generates the SQL query to fetch data, with the dates and filters as bound parameters.
+
+    The dates are asked for when not given. With aggregate=True the daily
+    per-EEID rollup is done by SQL Server and only the needed columns are
+    returned; pass the result to preprocess_data(df, aggregated=True).
+    A list of report types generates one shared query for all of them
+    (see generate_multi_report_query). conn is needed when a population's
+    EEIDs are passed through a temp table; the query must then run on it.
+    slice_filter is an extra (condition, params) on the rows, e.g. the EEID
+    hash bucket of a partitioned extract (see tools.partitioned_extract).
+    """
+    # Read from the reporting view containing daily employee hours summary
+    if start_date is None or end_date is None:
+        start_date, end_date = prompt_date_range()
+    if is_multi_report(report_type):
+        return generate_multi_report_query(report_type, start_date, end_date, aggregate=aggregate, conn=conn, slice_filter=slice_filter)
+    clause, params = population_filters([report_type], conn)[report_type]
+    params.update(date_params(start_date, end_date))
+    if slice_filter is not None:
+        clause = f"{clause}\n                    AND {slice_filter[0]}"
+        params.update(slice_filter[1])
+    where = f"""AT_Date BETWEEN :start_date AND :end_date
+                    AND {clause}"""
+    if aggregate:
+        query = f"""SELECT {aggregated_select_list()}
+                    FROM vw_VT_DailyEEHoursSummary
+                    WHERE {where}
+                    GROUP BY AT_Date, Employee_ID;
+                    """
+    else:
         query = f"""SELECT * FROM vw_VT_DailyEEHoursSummary
-                WHERE AT_Date BETWEEN '{start_date}' AND '{end_date}'
-                AND Employee_ID IN ({','.join(f"'{key}'" for key in EMPLOYEE_IDS.keys())});
-                """
-    return query
-
-def load_data(conn, query) -> pd.DataFrame:
-    """Loads data from the database into a DataFrame."""
-    result = conn.execute(text(query))
-    print(result)
-    df = pd.DataFrame(
-                    result.fetchall(),
-                    columns=result.keys()
-                    )
+                    WHERE {where};
+                    """
+    return bind_query(query, params)
+
+# Raw view columns held as Arrow strings in lean chunks
+LEAN_STRING_COLUMNS = {raw for raw, name in DICT_COL_NAMES.items() if name == 'EEID'} | set(DIMENSION_COLUMNS)
+
+def _typed_chunk(rows, columns, lean: bool = False) -> pd.DataFrame:
+    """
+    Builds a DataFrame from fetched rows column by column, with the hour columns typed up front.
+
+    The other columns get the types pandas infers from their values (as the
+    DataFrame of the fetched rows did), so extra numeric view columns are
+    still summed by preprocess_data. lean=True types the hours as
+    LEAN_HOUR_DTYPE and the EEID and dimension columns as Arrow strings
+    instead of Python string objects.
+    """
+    arrays = zip(*rows) if rows else [()] * len(columns)
+    data = {}
+    for col, values in zip(columns, arrays):
+        if col in RAW_HOUR_COLUMNS:
+            # None becomes NaN, as it did through the object-dtype DataFrame
+            data[col] = np.array(values, dtype=LEAN_HOUR_DTYPE if lean else RAW_HOUR_DTYPE)
+        elif lean and col in LEAN_STRING_COLUMNS:
+            data[col] = pd.array(values, dtype=LEAN_STRING_DTYPE)
+        else:
+            data[col] = pd.array(values, dtype=object)
+    return pd.DataFrame(data, columns=columns).infer_objects()
+
+def iter_data_chunks(conn, query, batch_size: int = None, lean: bool = False) -> Iterator[pd.DataFrame]:
+    """
+    Streams the query result as DataFrame chunks of at most batch_size rows.
+
+    The result is read with a server-side cursor (stream_results) and
+    fetchmany, so only one batch of Row objects is alive at a time. An empty
+    result still yields one empty chunk carrying the column names. lean
+    selects the memory-lean column types (see _typed_chunk).
+    """
+    batch_size = batch_size or LOAD_BATCH_SIZE
+    # Plain SQL strings are still accepted; generate_query returns bound statements
+    statement = text(query) if isinstance(query, str) else query
+    with stage("query"):
+        result = conn.execution_options(stream_results=True, max_row_buffer=batch_size).execute(statement)
+    columns = list(result.keys())
+    try:
+        rows = result.fetchmany(batch_size)
+        yield _typed_chunk(rows, columns, lean)
+        while rows:
+            rows = result.fetchmany(batch_size)
+            if rows:
+                yield _typed_chunk(rows, columns, lean)
+    finally:
+        result.close()
+
+def load_data(conn, query, batch_size: int = None, verbose: bool = True, lean: bool = False) -> pd.DataFrame:
+    """Loads data from the database into a DataFrame, fetching it in batches (lean: see iter_data_chunks)."""
+    start_time = time.perf_counter()
+    with stage("fetch") as labels:
+        chunks = list(iter_data_chunks(conn, query, batch_size, lean))
+        if len(chunks) == 1:
+            df = chunks[0]
+        else:
+            # A column that is all NULL in one batch comes back as object; infer its type over every batch
+            df = pd.concat(chunks, ignore_index=True, copy=False).infer_objects()
+        labels["rows"] = len(df)
+    if verbose:
+        elapsed = time.perf_counter() - start_time
+        rows_per_second = len(df) / elapsed if elapsed > 0 else float("inf")
+        peak_rss = peak_rss_mb()
+        print(f"Loaded {len(df)} rows in {len(chunks)} batches ({elapsed:.1f}s, {rows_per_second:,.0f} rows/s"
+              + (f", peak RSS {peak_rss:.0f} MB)" if peak_rss is not None else ")"))
     return df
     
-def preprocess_data(df: pd.DataFrame) -> pd.DataFrame:
-    """Preprocesses the DataFrame by handling missing values and converting data types."""
+@stage("preprocess")
+def preprocess_data(df: pd.DataFrame, aggregated: bool = False) -> pd.DataFrame:
+    """
+    Preprocesses the DataFrame by handling missing values and converting data types.
+
+    aggregated=True is for frames from generate_query(aggregate=True), which
+    are already rolled up per (Date, EEID) with the derived totals.
+    """
+    if aggregated:
+        df = df.copy()
+        df[CHART_COLUMNS + ['Productive Only', 'Total Hours']] = df[CHART_COLUMNS + ['Productive Only', 'Total Hours']].fillna(0).astype(float)
+        df['Date'] = pd.to_datetime(df['Date'])
+        df['Week'] = df['Date'].dt.to_period('W-SAT').dt.start_time
+        return df.sort_values(['Date', 'EEID'], ignore_index=True)
 
+    # Rows of a multi-report pull are grouped per population as well
+    df = explode_populations(df)
+    keys = ['Date', 'EEID'] + (['Population'] if 'Population' in df.columns else [])
     df = df.rename(columns=DICT_COL_NAMES)
-    agg_map = {col: 'sum' if pd.api.types.is_numeric_dtype(dtype) else 'first'
-            for col, dtype in df.dtypes.items()}
+    # Numeric columns (the hours) are summed, the others are dimensions that keep their first value
+    facts = [col for col, dtype in df.dtypes.items() if col not in keys and pd.api.types.is_numeric_dtype(dtype)]
+    dimensions = [col for col in df.columns if col not in keys and col not in facts]
 
     df[CHART_COLUMNS] = df[CHART_COLUMNS].fillna(0).astype(float)
     df['Date'] = pd.to_datetime(df['Date'])
-    df_grouped = (
-        df.groupby(['Date', 'EEID'], as_index=False)
-        .agg(agg_map)
-    )
-    df_grouped['Week'] = df_grouped['Date'].dt.to_period('W-SAT').dt.start_time
-    df_grouped['Productive Only'] = df_grouped[['Productive Active Hours', 'Productive Passive Hours', 'Undefined Hours', 'Unproductive Hours']].sum(axis=1)
-    df_grouped['Total Hours'] = df_grouped[CHART_COLUMNS].sum(axis=1)
-    return df_grouped
-
-def delete_files(folder_path):
-    """Deletes all files in the specified directory."""
-    if folder_path.exists():
-        for file in folder_path.glob('*'):
-            if file.is_file():
-                file.unlink()
+    # Rows without a Date or EEID belong to no group (groupby drops null keys)
+    if df[keys].isna().to_numpy().any():
+        df = df.dropna(subset=keys).reset_index(drop=True)
+    # Hashed keys: groups in order of appearance, only the rolled-up frame is sorted
+    grouped = df.groupby(keys, sort=False, observed=True)
+    df_grouped = grouped[facts].sum().reset_index()
+    df_grouped[dimensions] = first_dimension_values(df, dimensions, grouped.ngroup().to_numpy(), df_grouped['EEID'])
+    df_grouped = add_daily_totals(df_grouped)
+    # Population first, then the view columns in their order
+    columns = [col for col in keys if col == 'Population'] + [col for col in df.columns if col != 'Population']
+    return df_grouped[columns + ['Week', 'Productive Only', 'Total Hours']].sort_values(keys, ignore_index=True)
+
+def first_dimension_values(df: pd.DataFrame, columns: list, group_ids: np.ndarray, group_eeids: pd.Series) -> pd.DataFrame:
+    """
+    First non-null value of each dimension column per group (what
+    groupby().first() returns), for the groups numbered by group_ids.
+
+    Columns that hold a single value per EEID over the whole frame are
+    looked up in the deduplicated per-EEID table; only the columns that
+    change within an EEID are reduced per group, on the integer group ids
+    instead of the string keys.
+    """
+    eeid_rows = df[['EEID'] + columns].drop_duplicates()
+    if eeid_rows['EEID'].is_unique:
+        constant = columns
+    else:
+        constant = [col for col in columns if eeid_rows[['EEID', col]].drop_duplicates()['EEID'].is_unique]
+
+    table = eeid_rows.drop_duplicates('EEID')
+    positions = pd.Index(table['EEID']).get_indexer(group_eeids)
+    values = table[constant].take(positions).reset_index(drop=True)
+    for col in columns:
+        if col in constant:
+            continue
+        present = np.flatnonzero(df[col].notna().to_numpy())
+        first = pd.Series(group_ids[present]).drop_duplicates()
+        # Row of the first non-null value of every group, -1 (missing) for groups without one
+        rows = np.full(len(group_eeids), -1)
+        rows[first.to_numpy()] = present[first.index]
+        values[col] = df[col].array.take(rows, allow_fill=True)
+    return values[columns]
+
+def add_daily_totals(df: pd.DataFrame) -> pd.DataFrame:
+    """Adds Week (Sunday start), Productive Only and Total Hours to a daily frame, in one NumPy pass over its hours."""
+    dates = df['Date'].to_numpy()
+    days = dates.astype('datetime64[D]')
+    # 1970-01-01 was a Thursday, 4 days into its Sunday week
+    weeks = (days - (days.astype(np.int64) + 4) % 7).astype(dates.dtype)
+    hours = df[CHART_COLUMNS].to_numpy()
+    productive = [CHART_COLUMNS.index(col) for col in PRODUCTIVE_ONLY_COLUMNS]
+    return df.assign(**{
+        'Week': np.where(np.isnat(dates), dates, weeks),
+        'Productive Only': hours[:, productive].sum(axis=1),
+        'Total Hours': hours.sum(axis=1),
+    })
 
+@stage("preprocess")
+def preprocess_data_lean(df: pd.DataFrame, aggregated: bool = False):
+    """
+    Memory-lean variant of preprocess_data; returns (daily_df, dimensions).
+
+    daily_df has the same rows, keys, Week and totals as preprocess_data,
+    with the CHART_COLUMNS hours as LEAN_HOUR_DTYPE; other view columns are
+    not carried. dimensions has one row per EEID with its DIMENSION_COLUMNS
+    (the first known value of the period, see dimension_table), so the
+    descriptive attributes are not repeated on every daily row.
+    """
+    if not aggregated:
+        df = df.rename(columns=DICT_COL_NAMES)
+    dimensions = dimension_table(df)
+    flags = [col for col in df.columns if str(col).startswith(POPULATION_FLAG_PREFIX)]
+    # An aggregated multi-report pull is already tagged with its Population
+    population = ['Population'] if 'Population' in df.columns else []
+    df = df[['Date', 'EEID'] + population + CHART_COLUMNS + flags]
+    df = df.assign(**{col: df[col].fillna(0).astype(LEAN_HOUR_DTYPE) for col in CHART_COLUMNS}, Date=pd.to_datetime(df['Date']))
+    if not aggregated:
+        # Rows of a multi-report pull are grouped per population as well
+        df = explode_populations(df)
+        keys = ['Date', 'EEID'] + (['Population'] if 'Population' in df.columns else [])
+        df = df.groupby(keys, as_index=False)[CHART_COLUMNS].sum()
+    df = add_daily_totals(df)
+    if aggregated:
+        df = df.sort_values(['Date', 'EEID'] + population, ignore_index=True)
+    return df, dimensions
+
+def dimension_table(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    One row per EEID with the DIMENSION_COLUMNS of df: the first non-null
+    value of each column over the period, typed DIMENSION_DTYPE.
+    """
+    columns = [col for col in DIMENSION_COLUMNS if col in df.columns]
+    dimensions = df.groupby('EEID', sort=False)[columns].first().reset_index()
+    return dimensions.astype({col: DIMENSION_DTYPE for col in columns})
+
+def attach_dimensions(daily_df: pd.DataFrame, dimensions: pd.DataFrame, columns: list) -> pd.DataFrame:
+    """Adds the listed dimension columns that daily_df lacks from the per-EEID table (see preprocess_data_lean)."""
+    missing = [col for col in columns if col not in daily_df.columns and col in dimensions.columns]
+    if not missing:
+        return daily_df
+    return daily_df.merge(dimensions[['EEID'] + missing], on='EEID', how='left')
+
+def explode_populations(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Turns the In_Population_<type> flags of a multi-report pull into a
+    Population column, with one copy of each row per population it belongs to.
+    Frames without flags are returned unchanged.
+    """
+    flags = [col for col in df.columns if str(col).startswith(POPULATION_FLAG_PREFIX)]
+    if not flags:
+        return df
+    parts = [
+        df.loc[df[flag].astype(bool)].drop(columns=flags).assign(Population=int(flag[len(POPULATION_FLAG_PREFIX):]))
+        for flag in flags
+    ]
+    return pd.concat(parts, ignore_index=True)
+
+def split_populations(daily_df: pd.DataFrame, report_types) -> dict:
+    """Splits a preprocessed multi-report frame into {report_type: daily frame of its population}."""
+    by_population = {population: rows for population, rows in daily_df.groupby('Population', sort=False)}
+    return {
+        report_type: by_population[report_type].drop(columns='Population').reset_index(drop=True)
+        if report_type in by_population else daily_df.iloc[:0].drop(columns='Population')
+        for report_type in report_types
+    }
+
+@stage("aggregation")
 def delete_weekend_zero_hours(df: pd.DataFrame) -> pd.DataFrame:
     """Deletes weekend rows where total hours are zero."""
     df = df.copy()
@@ -82,6 +438,7 @@ def delete_weekend_zero_hours(df: pd.DataFrame) -> pd.DataFrame:
     df = df[~df['Not_Prod_Weekend']]
     return df
 
+@stage("aggregation")
 def custom_weekly_aggregation(df: pd.DataFrame) -> pd.DataFrame:
     """Aggregates data on a weekly basis."""
     weekly_df = df.groupby(['EEID', 'Week'], as_index=False).agg(
@@ -93,6 +450,7 @@ def custom_weekly_aggregation(df: pd.DataFrame) -> pd.DataFrame:
     weekly_df['Total Hours'] = weekly_df[CHART_COLUMNS].sum(axis=1)
     return weekly_df
 
+@stage("aggregation")
 def filter_missing_prod_users(weekly_df: pd.DataFrame) -> pd.DataFrame:
     """Filters users with missing productive hours (weekly total hours is 0)."""
     df_zero_prod = weekly_df.groupby('EEID', as_index=False)['Productive Only'].sum()
@@ -100,6 +458,7 @@ def filter_missing_prod_users(weekly_df: pd.DataFrame) -> pd.DataFrame:
     filtered_missing_df = weekly_df[weekly_df['EEID'].isin(eeid_missing_prod)].reset_index(drop=True)
     return filtered_missing_df, eeid_missing_prod
 
+@stage("aggregation")
 def filter_gap_days_users(weekly_df: pd.DataFrame, eeid_missing_prod) -> pd.DataFrame:
     """Filters users with gap days (weekly daily productive average less than 2 hours)."""
     weekly_df = weekly_df[~weekly_df['EEID'].isin(eeid_missing_prod)].reset_index(drop=True)
@@ -107,31 +466,65 @@ def filter_gap_days_users(weekly_df: pd.DataFrame, eeid_missing_prod) -> pd.Data
     filtered_gaps_df = weekly_df[weekly_df['EEID'].isin(eeid_with_gaps)].reset_index(drop=True)
     return filtered_gaps_df, eeid_with_gaps
 
+def classify_users(eeids: pd.Series, flagged: dict) -> dict:
+    """
+    Builds the status columns of the CSV datasets in one vectorized pass.
+
+    flagged maps a STATUS_LABELS column to the EEIDs flagged for it; each
+    column is a categorical with the flagged or the default label per row,
+    using hashed membership (isin) instead of scanning the EEID arrays per row.
+    """
+    statuses = {}
+    for column, flagged_eeids in flagged.items():
+        flagged_label, default_label = STATUS_LABELS[column]
+        codes = eeids.isin(flagged_eeids).to_numpy().astype(np.int8)
+        statuses[column] = pd.Categorical.from_codes(codes, categories=[default_label, flagged_label])
+    return statuses
+
+@stage("csv_write")
+def save_status_dataset(daily_df: pd.DataFrame, columns: list, flagged: dict, csv_path: str, dimensions: pd.DataFrame = None):
+    """
+    Writes the selected columns of daily_df plus the status columns of
+    flagged (see classify_users) to csv_path. Columns daily_df lacks are
+    taken from the per-EEID dimensions table, if given.
+    """
+    if dimensions is not None:
+        daily_df = attach_dimensions(daily_df, dimensions, columns)
+    daily_df[columns].assign(**classify_users(daily_df['EEID'], flagged)).to_csv(csv_path, index=False)
+
 def retrieve_username(eeid, reports_to=False):
     """
-    Docstring for retrieve_username
+    Returns the employee name (or Reports_To) for an EEID.
+
+    Served from the in-memory employee directory when the EEID was resolved
+    by load_employee_directory; falls back to a single-EEID query otherwise.
     """
-    
+    cached = lookup_reports_to(eeid) if reports_to else lookup_user_name(eeid)
+    if cached is not None:
+        return cached
+
     if reports_to:
-        query = f"""
+        query = text("""
                 SELECT DISTINCT Reports_To
                 FROM vw_VT_DailyEEHoursSummary
-                WHERE Employee_ID = '{eeid}'
+                WHERE Employee_ID = :eeid
                 AND Reports_To IS NOT NULL;
-                """
+                """).bindparams(eeid=eeid)
     else:
-        query = f"""
+        query = text("""
                 SELECT DISTINCT FName, LName
                 FROM vw_VT_DailyEEHoursSummary
-                WHERE Employee_ID = '{eeid}'
+                WHERE Employee_ID = :eeid
                 AND FName IS NOT NULL
                 AND LName IS NOT NULL;
-                """
+                """).bindparams(eeid=eeid)
     conn = None
     try:
         conn = alchemy_connection()
-        df = load_data(conn, query)
-        return f"{str(df.iloc[0, 0]).title()}" if reports_to else f"{str(df.iloc[0, 0]).title()} {str(df.iloc[0, 1]).title()}"
+        df = load_data(conn, query, verbose=False)
+        value = f"{str(df.iloc[0, 0]).title()}" if reports_to else f"{str(df.iloc[0, 0]).title()} {str(df.iloc[0, 1]).title()}"
+        update_directory({eeid: {("reports_to" if reports_to else "name"): value}})
+        return value
     except Exception as e:
         print(f"Error retrieving user name: {str(e)}")
         raise
@@ -145,18 +538,66 @@ def retrieve_username(eeid, reports_to=False):
                 pass
 
 
+@stage("aggregation")
+def add_accumulated_average(daily_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Adds 'Daily Productive Accumulated Average' (the running mean of Total Hours
+    within each EEID and week, in date order) to every row at once, with
+    grouped cumulative sums and counts instead of one expanding() per user-week.
+    """
+    daily_df = daily_df.sort_values(['EEID', 'Date'], kind='stable')
+    groups = daily_df.groupby(['EEID', 'Week'], sort=False)['Total Hours']
+    return daily_df.assign(**{'Daily Productive Accumulated Average': groups.cumsum() / (groups.cumcount() + 1)})
+
+@stage("aggregation")
+def report_statistics(daily_df: pd.DataFrame, weekly_df: pd.DataFrame) -> dict:
+    """
+    Computes the figures shown in the employee info of every report in one pass.
+
+    Returns {EEID: {'days_zero_prod', 'days_zero_prod_proportion', 'weeks_below_threshold'}}
+    for every EEID of weekly_df (users without daily rows get zeros).
+    """
+    eeids = pd.Index(weekly_df['EEID'].unique())
+    zero_days = daily_df['Total Hours'].eq(0).groupby(daily_df['EEID']).agg(['sum', 'size']).reindex(eeids, fill_value=0)
+    weekly_average = pd.to_numeric(weekly_df['Daily Productive Average'], errors='coerce')
+    weeks_below = weekly_average.lt(2).groupby(weekly_df['EEID']).sum().reindex(eeids, fill_value=0)
+    statistics = pd.DataFrame({
+        'days_zero_prod': zero_days['sum'].astype(int),
+        'days_zero_prod_proportion': (zero_days['sum'] / zero_days['size'].where(zero_days['size'] > 0)).fillna(0.0),
+        'weeks_below_threshold': weeks_below.astype(int),
+    }, index=eeids)
+    return statistics.to_dict('index')
+
+def user_report_statistics(daily_user_df: pd.DataFrame, weekly_user_df: pd.DataFrame) -> dict:
+    """Computes the report_statistics figures of a single user."""
+    if 'Total Hours' not in daily_user_df.columns:
+        raise KeyError("daily_user_df must contain 'Total Hours' column.")
+    if 'Daily Productive Average' not in weekly_user_df.columns:
+        raise KeyError("weekly_user_df must contain 'Daily Productive Average' column.")
+    days_zero_prod = int(daily_user_df['Total Hours'].eq(0).sum())
+    total_days = int(daily_user_df.shape[0])
+    weekly_average = pd.to_numeric(weekly_user_df['Daily Productive Average'], errors='coerce')
+    return {
+        'days_zero_prod': days_zero_prod,
+        'days_zero_prod_proportion': (days_zero_prod / total_days) if total_days > 0 else 0.0,
+        'weeks_below_threshold': int((weekly_average < 2).sum()),
+    }
+
 def create_text_parameters(
     report_type,
     week_start=None,
     week_end=None,
     eeid=None,
     daily_user_df=None,
-    weekly_user_df=None
+    weekly_user_df=None,
+    statistics=None
 ):
     """
     Build title, employee info, and description strings for reports.
 
     report_type: 1 = Gap Days, 2 = Zero Productivity, 3 = Productivity
+    statistics: the user's entry of report_statistics; computed from the
+    user's frames when not given.
     """
 
     # ---- Validation / Defaults ----
@@ -164,7 +605,7 @@ def create_text_parameters(
         raise ValueError("eeid is required.")
 
     # Ensure DataFrames are provided
-    if daily_user_df is None or weekly_user_df is None:
+    if statistics is None and (daily_user_df is None or weekly_user_df is None):
         raise ValueError("Both daily_user_df and weekly_user_df are required.")
 
     # ---- Title & User Name ----
@@ -196,100 +637,326 @@ def create_text_parameters(
     # ---- Reports To ----
     reports_to = str(retrieve_username(eeid, reports_to=True) or "")
 
-    # ---- Numeric Safety & Aggregations ----
-    # Make sure columns exist
-    if 'Total Hours' not in daily_user_df.columns:
-        raise KeyError("daily_user_df must contain 'Total Hours' column.")
+    # ---- Aggregations ----
+    if statistics is None:
+        statistics = user_report_statistics(daily_user_df, weekly_user_df)
+    days_zero_prod = statistics['days_zero_prod']
+    days_zero_prod_proportion = statistics['days_zero_prod_proportion']
+    weeks_below_threshold = statistics['weeks_below_threshold']
 
-    # days with zero productive hours
-    days_zero_prod = int(daily_user_df['Total Hours'].eq(0).sum())
+    # User info
+    employee_info = f"Employee ID: {eeid}.|Name: {user_name}.|Reports To: {reports_to}.|Total Days with Zero Productive Hours: {days_zero_prod} ({days_zero_prod_proportion:.2%}).|Total Weeks Where Daily Productive Average is Below Threshold (2 hours): {weeks_below_threshold}."
+    
+    return (title, employee_info, REPORT_DESCRIPTION)
 
-    # denominator safety
-    total_days = int(daily_user_df.shape[0])
-    days_zero_prod_proportion = (days_zero_prod / total_days) if total_days > 0 else 0.0
+# Description of every report ("|" separates the paragraphs); the same for all employees
+REPORT_DESCRIPTION = """How to read this report?|The chart below displays the user's weekly working hours. Each bar corresponds to a specific category, as described in the legend beneath the chart. The magenta line shows the trend of the user's average hours worked each week, and the markers with data labels indicate the exact average for that week.|To dive deeper into each week, refer to the auxiliary charts on the right-hand side. These charts are arranged chronologically from top to bottom, with each one representing a single week. The bars show the total hours worked per day, the red arrows highlight days with zero activity, and the blue line represents the trend of the accumulated average working hours. The magenta value at the end of the line emphasizes the final average hours worked for that week."""
 
-    # weekly threshold counts
-    if 'Daily Productive Average' not in weekly_user_df.columns:
-        raise KeyError("weekly_user_df must contain 'Daily Productive Average' column.")
+# Report names by report type, as used in titles and file names
+REPORT_LABELS = {1: "Gap Days Report", 2: "Zero Productivity Report", 3: "Productivity Report"}
 
-    # ensure numeric for comparison
-    w = weekly_user_df.copy()
-    w['Daily Productive Average'] = pd.to_numeric(
-        w['Daily Productive Average'], errors='coerce'
-    )
-    weeks_below_threshold = int((w['Daily Productive Average'] < 2).sum())
+def reports_root_folder(output_folder_path: str, report_type) -> Path:
+    """Returns the reports folder of a report type (where its manifest lives)."""
+    if report_type == 1:
+        return Path(f"{output_folder_path}gap_reports/")
+    elif report_type == 2:
+        return Path(f"{output_folder_path}zero_prod_reports/")
+    elif report_type == 3:
+        return Path(f"{output_folder_path}randy_reports/")
 
-    # User info
-    employee_info = f"Employee ID: {eeid}.|Name: {user_name}.|Reports To: {reports_to}.|Total Days with Zero Productive Hours: {days_zero_prod} ({days_zero_prod_proportion:.2%}).|Total Weeks Where Daily Productive Average is Below Threshold (2 hours): {weeks_below_threshold}."
-    
-    # Drescription
-    description = f"""How to read this report?|The chart below displays the user's weekly working hours. Each bar corresponds to a specific category, as described in the legend beneath the chart. The magenta line shows the trend of the user's average hours worked each week, and the markers with data labels indicate the exact average for that week.|To dive deeper into each week, refer to the auxiliary charts on the right-hand side. These charts are arranged chronologically from top to bottom, with each one representing a single week. The bars show the total hours worked per day, the red arrows highlight days with zero activity, and the blue line represents the trend of the accumulated average working hours. The magenta value at the end of the line emphasizes the final average hours worked for that week."""
-    return (title, employee_info, description)
-
-def users_chart_creator(daily_df: pd.DataFrame, weekly_df: pd.DataFrame, input_folder_path: str, output_folder_path: str, week_start: str, week_end: str, report_type):
-    times = []
-    for eeid in tqdm(weekly_df['EEID'].unique(), desc="Processing users"):
-        start_time = time.perf_counter()
-        daily_user_df = daily_df[daily_df['EEID'] == eeid]
-        emp_weekly_gap_days_df = weekly_df[weekly_df['EEID'] == eeid]
-        weekly_bar_chart(emp_weekly_gap_days_df, input_folder_path)
-        sorted_weeks = sorted(daily_user_df['Week'].unique())
-        for i, week in enumerate(sorted_weeks):
-            week_df = daily_user_df[daily_user_df['Week'] == week]
-            week_time_df = week_df[
-                                    ['Date',
-                                     'Productive Active Hours',
-                                      'Productive Passive Hours',
-                                      'Holiday Hours',
-                                      'PTO Hours',
-                                      'Undefined Hours',
-                                      'Unproductive Hours',
-                                      'Total Hours',]
-                                    ].sort_values('Date')
-
-            week_time_df['Daily Productive Accumulated Average'] = (
-                                                                    week_time_df['Total Hours']
-                                                                    .expanding()
-                                                                    .mean()
-                                                                    )
-            daily_bar_chart(week_time_df, input_folder_path, week, f"daily_productive_hours_week{i + 1}")
-        text_parameters = create_text_parameters(report_type=report_type, week_start=week_start, week_end=week_end, eeid=eeid, daily_user_df=daily_user_df, weekly_user_df=emp_weekly_gap_days_df)
-
-        if report_type == 1:
-            if "gap_reports" not in os.listdir(f"{output_folder_path}"):
-                os.makedirs(f"{output_folder_path}gap_reports/")
-            output_folder_reports = Path(f"{output_folder_path}gap_reports/")
-            user_name = str(retrieve_username(eeid) or "")
-            generate_png_report(text_parameters, input_folder_path, output_folder_reports, f"Gap Days Report - {eeid} {user_name}", num_weeks=len(sorted_weeks))
-        elif report_type == 2:
-            if "zero_prod_reports" not in os.listdir(f"{output_folder_path}"):
-                os.makedirs(f"{output_folder_path}zero_prod_reports/")
-            output_folder_reports = Path(f"{output_folder_path}zero_prod_reports/")
-            user_name = str(retrieve_username(eeid) or "")
-            generate_png_report(text_parameters, input_folder_path, output_folder_reports, f"Zero Productivity Report - {eeid} {user_name}", num_weeks=len(sorted_weeks))
-        elif report_type == 3:
-            user_name = EMPLOYEE_IDS[eeid]
-            if f"{eeid} - {user_name}" not in os.listdir(f"{output_folder_path}randy_reports/"):
-                os.makedirs(f"{output_folder_path}randy_reports/{eeid} - {user_name}/")
-            output_folder_reports = Path(f"{output_folder_path}randy_reports/{eeid} - {user_name}/")
-            generate_png_report(text_parameters, input_folder_path, output_folder_reports, f"Productivity Report - {eeid} {user_name} ({week_start} - {week_end})", num_weeks=len(sorted_weeks))
-
-        time.sleep(0.1)
-        end_time = time.perf_counter()
-        times.append(end_time - start_time)
-    print(f"The average time for the creation of one report is {np.mean(times)}")
-
-def generate_gapdays_missingprod_reports(daily_df: pd.DataFrame, input_folder_path: str, output_folder_path: str):
-    """Identifies users with gap days (users which at least on weekly daily productive average is less than 2 hours)."""
+def report_output_folder(output_folder_path: str, report_type, eeid) -> Path:
+    """Returns (and creates if needed) the folder where the report of an EEID is saved."""
+    folder = reports_root_folder(output_folder_path, report_type)
+    if report_type == 3:
+        folder = folder / f"{eeid} - {EMPLOYEE_IDS[eeid]}"
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+def report_output_name(report_type, eeid, week_start: str, week_end: str) -> str:
+    """Returns the file name (without extension) of the report of an EEID."""
+    if report_type == 1:
+        return f"Gap Days Report - {eeid} {str(retrieve_username(eeid) or '')}"
+    elif report_type == 2:
+        return f"Zero Productivity Report - {eeid} {str(retrieve_username(eeid) or '')}"
+    elif report_type == 3:
+        return f"Productivity Report - {eeid} {EMPLOYEE_IDS[eeid]} ({week_start} - {week_end})"
+
+def render_user_report(eeid, daily_user_df: pd.DataFrame, emp_weekly_gap_days_df: pd.DataFrame, output_folder_reports: Path, output_name: str, week_start: str, week_end: str, report_type, statistics=None, shared_charts_folder=None, background_encode=False) -> float:
+    """
+    Renders the charts and the PNG report of one user and returns the time it took.
+
+    The charts are handed to the compositor as in-memory images, in week order,
+    so nothing is written to or read back from disk before the final report.
+    The accumulated averages (add_accumulated_average) and the statistics
+    (report_statistics) are precomputed for all users; they are only computed
+    here when missing. With shared_charts_folder, charts already rendered from
+    the same data by another report of the run are reused. With
+    background_encode the report file is written by the encoding pool and
+    the returned time does not include encoding (see report_encoding).
+    """
+    start_time = time.perf_counter()
+    if 'Daily Productive Accumulated Average' not in daily_user_df.columns:
+        daily_user_df = add_accumulated_average(daily_user_df)
+    week_frames = user_week_frames(daily_user_df)
+    text_parameters = create_text_parameters(report_type=report_type, week_start=week_start, week_end=week_end, eeid=eeid, daily_user_df=daily_user_df, weekly_user_df=emp_weekly_gap_days_df, statistics=statistics)
+    # The charts are rendered at the size of their slots in this report
+    slot_sizes = report_chart_slots(text_parameters, len(week_frames))
+    # Every chart of the user is rendered in one batch
+    with stage("chart_render", eeid=eeid):
+        if shared_charts_folder is None:
+            weekly_image, daily_images = user_chart_images(emp_weekly_gap_days_df, week_frames, slot_sizes)
+        else:
+            chart_key = fingerprint_user(daily_user_df, emp_weekly_gap_days_df, "charts", get_chart_backend(), slot_sizes)
+            weekly_image, daily_images = shared_user_chart_images(emp_weekly_gap_days_df, week_frames, slot_sizes, shared_charts_folder, chart_key)
+    try:
+        compose_png_report(text_parameters, weekly_image, daily_images, output_folder_reports, output_name, background=background_encode)
+    finally:
+        # Release the chart buffers now rather than when the garbage collector gets to them
+        for image in [weekly_image, *daily_images]:
+            image.close()
+    return time.perf_counter() - start_time
+
+def _init_render_worker(directory_entries: dict, chart_backend: str):
+    """Gives each worker process the run's employee directory and chart backend."""
+    update_directory(directory_entries)
+    set_chart_backend(chart_backend)
+    if chart_backend == "plotly":
+        start_renderer()
+
+def _render_user_report_task(eeid, daily_user_df, emp_weekly_gap_days_df, output_folder_reports, output_name, week_start, week_end, report_type, statistics, shared_charts_folder):
+    elapsed = render_user_report(eeid, daily_user_df, emp_weekly_gap_days_df, output_folder_reports, output_name, week_start, week_end, report_type, statistics, shared_charts_folder)
+    # The stage records of the worker travel back with the result
+    return eeid, elapsed, drain_records()
+
+def user_week_frames(daily_user_df: pd.DataFrame) -> list:
+    """(week, rows) pairs of one user in chronological order, with the columns of the daily charts."""
+    week_frames = []
+    for week, week_df in split_weeks(daily_user_df):
+        week_time_df = week_df[
+                                ['Date',
+                                 'Productive Active Hours',
+                                  'Productive Passive Hours',
+                                  'Holiday Hours',
+                                  'PTO Hours',
+                                  'Undefined Hours',
+                                  'Unproductive Hours',
+                                  'Total Hours',
+                                  'Daily Productive Accumulated Average',]
+                                ]
+        week_frames.append((week, week_time_df))
+    return week_frames
+
+def split_weeks(daily_user_df: pd.DataFrame) -> list:
+    """
+    Splits the rows of one user into (week, rows) pairs in chronological order.
+
+    After a single sort by date every week is a contiguous run of rows, so
+    the weeks are positional slices found in one pass instead of one scan per week.
+    """
+    daily_user_df = daily_user_df.sort_values('Date', kind='stable')
+    weeks = daily_user_df['Week'].to_numpy()
+    if len(weeks) == 0:
+        return []
+    starts = np.concatenate(([0], np.flatnonzero(weeks[1:] != weeks[:-1]) + 1))
+    ends = np.append(starts[1:], len(weeks))
+    return [(pd.Timestamp(weeks[start]), daily_user_df.iloc[start:end]) for start, end in zip(starts, ends)]
+
+def partition_by_eeid(df: pd.DataFrame) -> dict:
+    """Splits df into one frame per EEID with a single groupby pass (EEID -> rows of that EEID)."""
+    return {eeid: df.iloc[positions] for eeid, positions in df.groupby('EEID', sort=False).indices.items()}
+
+def users_chart_creator(daily_df: pd.DataFrame, weekly_df: pd.DataFrame, output_folder_path: str, week_start: str, week_end: str, report_type, workers=None, chart_backend=None, incremental=None, shared_charts=None, dimensions=None):
+    """
+    Creates the report of every user in weekly_df.
+
+    With incremental=True (the default), users whose report in the folder's
+    manifest was built from the same data and renderer are skipped (see report_manifest).
+    With workers > 1 the users are rendered by a process pool and the
+    per-user timings are collected back in this process; sequential runs
+    encode each report in a background thread while the next user renders.
+    chart_backend selects the chart backend for this run (see CHART_BACKENDS).
+    shared_charts ({'folder': path, 'eeids': set}) lets the listed users reuse
+    charts rendered from identical data by another report of the run.
+    dimensions is the per-EEID table of preprocess_data_lean, when daily_df
+    does not carry the name and Reports_To columns itself.
+    With REPORT_FORMAT "pdf" the reports are written by users_pdf_creator
+    instead, sequentially, with the matplotlib charts and without the
+    manifest or shared charts: setting those arguments prints a warning.
+    """
+    if REPORT_FORMAT == "pdf":
+        ignored = []
+        if (REPORT_WORKERS if workers is None else workers) > 1:
+            ignored.append("workers")
+        if chart_backend not in (None, "matplotlib"):
+            ignored.append("chart_backend")
+        if incremental:
+            ignored.append("incremental")
+        if shared_charts:
+            ignored.append("shared_charts")
+        if ignored:
+            print(f"Warning: PDF reports are written sequentially with the matplotlib charts and always rewritten; ignoring {', '.join(ignored)}.")
+        return users_pdf_creator(daily_df, weekly_df, output_folder_path, week_start, week_end, report_type, dimensions=dimensions)
+    if incremental is None:
+        incremental = True
+    if workers is None:
+        workers = REPORT_WORKERS
+    if chart_backend is not None:
+        set_chart_backend(chart_backend)
+    chart_backend = get_chart_backend()
+    eeids = weekly_df['EEID'].unique()
+    # Resolve every name and manager of the run up front instead of per user
+    directory_entries = load_employee_directory(eeids, daily_df if dimensions is None else dimensions)
+
+    reports_folder = reports_root_folder(output_folder_path, report_type)
+    manifest = load_manifest(reports_folder)
+    # Accumulated averages and report figures of every user are computed once, before rendering
+    daily_df = add_accumulated_average(daily_df)
+    statistics = report_statistics(daily_df, weekly_df)
+    # Partition both frames once instead of scanning them for every user
+    daily_by_eeid = partition_by_eeid(daily_df)
+    weekly_by_eeid = partition_by_eeid(weekly_df)
+    empty_daily_df = daily_df.iloc[:0]
+    jobs = []
+    for eeid in eeids:
+        daily_user_df = daily_by_eeid.get(eeid, empty_daily_df)
+        emp_weekly_gap_days_df = weekly_by_eeid[eeid]
+        output_name = report_output_name(report_type, eeid, week_start, week_end)
+        fingerprint = fingerprint_user(daily_user_df, emp_weekly_gap_days_df, report_type, chart_backend, week_start, week_end, output_name, lookup_reports_to(eeid), REPORT_FORMAT)
+        if incremental and is_up_to_date(manifest, reports_folder, eeid, fingerprint):
+            continue
+        shared_charts_folder = shared_charts['folder'] if shared_charts and eeid in shared_charts['eeids'] else None
+        jobs.append((eeid, daily_user_df, emp_weekly_gap_days_df, report_output_folder(output_folder_path, report_type, eeid), output_name, fingerprint, shared_charts_folder))
+    if len(jobs) < len(eeids):
+        print(f"Skipping {len(eeids) - len(jobs)} reports that are up to date; rendering {len(jobs)}.")
+
+    times = {}
+    fingerprints = {job[0]: (job[3], job[4], job[5]) for job in jobs}
+
+    def record(eeid, elapsed):
+        output_folder_reports, output_name, fingerprint = fingerprints[eeid]
+        times[eeid] = elapsed
+        record_user_time(report_type, eeid, elapsed)
+        record_report(manifest, reports_folder, eeid, fingerprint, output_folder_reports / f"{output_name}{report_suffix()}")
+
+    try:
+        if workers <= 1:
+            if chart_backend == "plotly":
+                start_renderer()
+            rendered = False
+            try:
+                for eeid, daily_user_df, emp_weekly_gap_days_df, output_folder_reports, output_name, _, shared_charts_folder in tqdm(jobs, desc="Processing users"):
+                    record(eeid, render_user_report(eeid, daily_user_df, emp_weekly_gap_days_df, output_folder_reports, output_name, week_start, week_end, report_type, statistics[eeid], shared_charts_folder, background_encode=True))
+                rendered = True
+            finally:
+                stop_renderer()
+                # The manifest may only list files that were written
+                try:
+                    wait_for_encodes()
+                except Exception as error:
+                    if rendered:
+                        raise
+                    # Keep the render error that is already propagating
+                    print(f"Background encode failed as well: {error}")
+            stats = renderer_stats()
+            if stats['figures']:
+                batches = f"in {stats['batches']} batches" if stats['batches'] else "one at a time"
+                print(f"Rendered {stats['figures']} charts {batches} ({stats['seconds_per_figure']:.3f}s per chart)")
+        else:
+            print(f"Rendering {len(jobs)} reports with {workers} worker processes...")
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_render_worker, initargs=(directory_entries, chart_backend)) as executor:
+                futures = [
+                    executor.submit(_render_user_report_task, eeid, daily_user_df, emp_weekly_gap_days_df, output_folder_reports, output_name, week_start, week_end, report_type, statistics[eeid], shared_charts_folder)
+                    for eeid, daily_user_df, emp_weekly_gap_days_df, output_folder_reports, output_name, _, shared_charts_folder in jobs
+                ]
+                for future in tqdm(as_completed(futures), total=len(futures), desc="Processing users"):
+                    eeid, elapsed, records = future.result()
+                    merge_records(records)
+                    record(eeid, elapsed)
+    finally:
+        # Keep what was rendered even if the run stops half way
+        if times:
+            save_manifest(reports_folder, manifest)
+
+    if times:
+        values = np.fromiter(times.values(), dtype=float)
+        print(f"The average time for the creation of one report is {values.mean()}")
+        print(f"Report time percentiles (s): p50={np.percentile(values, 50):.3f} p95={np.percentile(values, 95):.3f} max={values.max():.3f} (total render time {values.sum():.1f}s)"
+              + (", encoding excluded (background encodes)" if background_encodes() else ""))
+    return times
+
+def users_pdf_creator(daily_df: pd.DataFrame, weekly_df: pd.DataFrame, output_folder_path: str, week_start: str, week_end: str, report_type, grouping=None, dimensions=None):
+    """
+    Writes the reports of every user in weekly_df as vector PDF pages (see pdf_report_generator).
+
+    grouping (PDF_GROUPING by default) writes one PDF per employee, per
+    manager (Reports_To) or one for the whole batch. Pages are built one at a
+    time while the PDF is written, so only one user's data is drawn at once.
+    PDFs are always written again; the reports manifest only tracks
+    per-employee image reports. dimensions: see users_chart_creator.
+    """
+    grouping = grouping or PDF_GROUPING
+    if grouping not in PDF_GROUPINGS:
+        raise ValueError(f"Unknown PDF grouping '{grouping}'. Available: {', '.join(PDF_GROUPINGS)}")
+    eeids = weekly_df['EEID'].unique()
+    if len(eeids) == 0:
+        return {}
+    load_employee_directory(eeids, daily_df if dimensions is None else dimensions)
+    daily_df = add_accumulated_average(daily_df)
+    statistics = report_statistics(daily_df, weekly_df)
+    daily_by_eeid = partition_by_eeid(daily_df)
+    weekly_by_eeid = partition_by_eeid(weekly_df)
+    empty_daily_df = daily_df.iloc[:0]
+
+    label = REPORT_LABELS.get(report_type, "Report")
+    reports_folder = reports_root_folder(output_folder_path, report_type)
+    os.makedirs(reports_folder, exist_ok=True)
+    if grouping == "employee":
+        groups = {eeid: [eeid] for eeid in eeids}
+    elif grouping == "manager":
+        groups = {}
+        for eeid in eeids:
+            groups.setdefault(lookup_reports_to(eeid) or "No Manager", []).append(eeid)
+    else:
+        groups = {None: list(eeids)}
+
+    times = {}
+
+    def pages(group_eeids):
+        for eeid in group_eeids:
+            start_time = time.perf_counter()
+            daily_user_df = daily_by_eeid.get(eeid, empty_daily_df)
+            emp_weekly_gap_days_df = weekly_by_eeid[eeid]
+            title, employee_info, _ = create_text_parameters(report_type=report_type, week_start=week_start, week_end=week_end, eeid=eeid, statistics=statistics[eeid])
+            yield eeid, title, employee_info, emp_weekly_gap_days_df, user_week_frames(daily_user_df)
+            # Resumed once the page is written
+            times[eeid] = time.perf_counter() - start_time
+            record_user_time(report_type, eeid, times[eeid])
+
+    title = f"{label} ({week_start} - {week_end})"
+    with tqdm(total=len(eeids), desc="Writing PDF pages") as progress:
+        for group, group_eeids in groups.items():
+            if grouping == "employee":
+                output_file = report_output_folder(output_folder_path, report_type, group) / f"{report_output_name(report_type, group, week_start, week_end)}.pdf"
+            elif grouping == "manager":
+                output_file = reports_folder / f"{label} - {safe_file_name(group)} ({week_start} - {week_end}).pdf"
+            else:
+                output_file = reports_folder / f"{title}.pdf"
+            progress.update(write_pdf_report(output_file, title, REPORT_DESCRIPTION, pages(group_eeids)))
+    print(f"Wrote {len(times)} report pages into {len(groups)} PDF files ({grouping}) in {reports_folder}")
+    return times
+
+def generate_gapdays_missingprod_reports(daily_df: pd.DataFrame, output_folder_path: str, shared_charts=None, dimensions=None):
+    """
+    Identifies users with gap days (users which at least on weekly daily productive average is less than 2 hours).
+
+    shared_charts is passed to users_chart_creator (multi-report runs).
+    dimensions is the per-EEID table of preprocess_data_lean, if daily_df came from it.
+    """
     print("Segmenting users with gap days...")
     # Parameters
-    input_folder = Path(input_folder_path)
     week_start = min(daily_df['Week']).strftime('%b %d, %Y')
     week_end = (max(daily_df['Week']) + pd.Timedelta(days=6)).strftime('%b %d, %Y')
 
-    # Clear input folder if it contains files
-    delete_files(input_folder)
-
     # Remove weekends with zero hours
     cleaned_daily_df = delete_weekend_zero_hours(daily_df)
 
@@ -303,46 +970,34 @@ def generate_gapdays_missingprod_reports(daily_df: pd.DataFrame, input_folder_pa
     print(f"Found {len(eeid_missing_prod)} users with all weeks having zero productive hours.")
     print(f"The proportion of users with all weeks having zero productive hours is {len(eeid_missing_prod) / daily_df['EEID'].nunique()}")
     
-    miss_eeids_done = eeids_reports_cache(verbose=False)  # returns a set
-    if miss_eeids_done:  # only proceed if there are reports
-        miss_eeids_pending = list(set(eeid_missing_prod) - miss_eeids_done)
-        if miss_eeids_pending:
-            print(f"Proceeding with {len(miss_eeids_pending)} pending EEIDs...")
-            users_chart_creator(cleaned_daily_df[cleaned_daily_df['EEID'].isin(miss_eeids_pending)], weekly_filtered_missing_df[weekly_filtered_missing_df['EEID'].isin(miss_eeids_pending)], input_folder_path, output_folder_path, week_start, week_end, report_type=2)
-    else:
-        print("No reports found in the folder. Skipping removal.")
-        users_chart_creator(cleaned_daily_df[cleaned_daily_df['EEID'].isin(eeid_missing_prod)], weekly_filtered_missing_df[weekly_filtered_missing_df['EEID'].isin(eeid_missing_prod)], input_folder_path, output_folder_path, week_start, week_end, report_type=2)
+    # Reports already rendered from the same data are skipped through the reports manifest
+    users_chart_creator(cleaned_daily_df[cleaned_daily_df['EEID'].isin(eeid_missing_prod)], weekly_filtered_missing_df, output_folder_path, week_start, week_end, report_type=2, shared_charts=shared_charts, dimensions=dimensions)
 
     # Determine users with gap days
     weekly_filtered_gaps_df, eeid_with_gaps = filter_gap_days_users(weekly_df, eeid_missing_prod)
     print(f"Found {len(eeid_with_gaps)} users with gap days.")
     print(f"The proportion of users with gap days is {len(eeid_with_gaps) / daily_df['EEID'].nunique()}")
     
-    gap_eeids_done = eeids_reports_cache(reports_folder_name="gap_reports", verbose=False)  # returns a set
-
-    if gap_eeids_done:  # only proceed if there are reports
-        gap_eeids_pending = list(set(eeid_with_gaps) - gap_eeids_done)
-        if gap_eeids_pending:
-            print(f"Proceeding with {len(gap_eeids_pending)} pending EEIDs...")
-            users_chart_creator(cleaned_daily_df[cleaned_daily_df['EEID'].isin(gap_eeids_pending)], weekly_filtered_gaps_df[weekly_filtered_gaps_df['EEID'].isin(gap_eeids_pending)], input_folder_path, output_folder_path, week_start, week_end, report_type=1)
-    else:
-        print("No reports found in the folder. Skipping removal.")
-        users_chart_creator(cleaned_daily_df[cleaned_daily_df['EEID'].isin(eeid_with_gaps)], weekly_filtered_gaps_df[weekly_filtered_gaps_df['EEID'].isin(eeid_with_gaps)], input_folder_path, output_folder_path, week_start, week_end, report_type=1)
+    users_chart_creator(cleaned_daily_df[cleaned_daily_df['EEID'].isin(eeid_with_gaps)], weekly_filtered_gaps_df, output_folder_path, week_start, week_end, report_type=1, shared_charts=shared_charts, dimensions=dimensions)
 
     # Save CSV dataset
     print('Saving CSV dataset...')
-    df_to_save = daily_df[['Date', 'Week', 'EEID', 'AT_UserName', 'FName', 'LName', 'EmployeeTypeDescription', 'Title', 'Company Project Code Desc Only', 'Location', 'Reports_To']].copy()
-    df_to_save['Gap_Status'] = df_to_save['EEID'].apply(lambda x: 'Gap' if x in eeid_with_gaps else 'No Gap')
-    df_to_save['Missing_Prod_Status'] = df_to_save['EEID'].apply(lambda x: 'Missing Prod' if x in eeid_missing_prod else 'Has Prod')
-    df_to_save.to_csv(f"{output_folder_path}csv_datasets/GapDaysDataset_{week_start}_{week_end}.csv", index=False)
+    save_status_dataset(
+        daily_df,
+        DATASET_COLUMNS,
+        {'Gap_Status': eeid_with_gaps, 'Missing_Prod_Status': eeid_missing_prod},
+        f"{output_folder_path}csv_datasets/GapDaysDataset_{week_start}_{week_end}.csv",
+        dimensions,
+    )
 
-def generate_productivity_reports(daily_df: pd.DataFrame, input_folder_path: str, output_folder_path: str):
-    """Create the productivity reports for each user in the df."""
-    print("Process for report productivity started...")
-    # Clear input folder if it contains files
-    input_folder = Path(input_folder_path)
-    delete_files(input_folder)
+def generate_productivity_reports(daily_df: pd.DataFrame, output_folder_path: str, shared_charts=None, dimensions=None):
+    """
+    Create the productivity reports for each user in the df.
 
+    shared_charts is passed to users_chart_creator (multi-report runs).
+    dimensions is the per-EEID table of preprocess_data_lean, if daily_df came from it.
+    """
+    print("Process for report productivity started...")
     # Week parameters
     week_start = min(daily_df['Week']).strftime('%b %d, %Y')
     week_end = (max(daily_df['Week']) + pd.Timedelta(days=6)).strftime('%b %d, %Y')
@@ -354,7 +1009,7 @@ def generate_productivity_reports(daily_df: pd.DataFrame, input_folder_path: str
     weekly_df = custom_weekly_aggregation(cleaned_daily_df)
 
     print(f"Total users analyzed: {cleaned_daily_df['EEID'].nunique()}")
-    users_chart_creator(cleaned_daily_df, weekly_df, input_folder_path, output_folder_path, week_start=week_start, week_end=week_end, report_type=3)
+    users_chart_creator(cleaned_daily_df, weekly_df, output_folder_path, week_start=week_start, week_end=week_end, report_type=3, shared_charts=shared_charts, dimensions=dimensions)
     
     # Determine users with zero productive hours
     weekly_filtered_missing_df, eeid_missing_prod = filter_missing_prod_users(weekly_df)
@@ -368,7 +1023,38 @@ def generate_productivity_reports(daily_df: pd.DataFrame, input_folder_path: str
 
     # Save CSV dataset
     print('Saving CSV dataset...')
-    df_to_save = daily_df[['Date', 'Week', 'EEID', 'Productive Only', 'AT_UserName', 'FName', 'LName', 'EmployeeTypeDescription', 'Title', 'Company Project Code Desc Only', 'Location', 'Reports_To']].copy()
-    df_to_save['Gap_Status'] = df_to_save['EEID'].apply(lambda x: 'Gap' if x in eeid_with_gaps else 'No Gap')
-    df_to_save['Missing_Prod_Status'] = df_to_save['EEID'].apply(lambda x: 'Missing Prod' if x in eeid_missing_prod else 'Has Prod')
-    df_to_save.to_csv(f"{output_folder_path}csv_datasets/AnalysisRandyRequest_{week_start}_{week_end}.csv", index=False)
+    save_status_dataset(
+        daily_df,
+        DATASET_COLUMNS[:3] + ['Productive Only'] + DATASET_COLUMNS[3:],
+        {'Gap_Status': eeid_with_gaps, 'Missing_Prod_Status': eeid_missing_prod},
+        f"{output_folder_path}csv_datasets/AnalysisRandyRequest_{week_start}_{week_end}.csv",
+        dimensions,
+    )
+
+# Report types served by each generator of a multi-report run, in run order
+REPORT_GENERATORS = {
+    1: generate_gapdays_missingprod_reports,
+    3: generate_productivity_reports,
+}
+
+def generate_multi_reports(daily_df: pd.DataFrame, report_types, output_folder_path: str, dimensions=None):
+    """
+    Runs the generators of several report types from one preprocessed
+    multi-report frame (see generate_multi_report_query).
+
+    Users present in more than one population share their charts: they are
+    rendered once and reused by every report built from identical data.
+    PDF reports draw their charts per page and share nothing.
+    """
+    populations = split_populations(daily_df, report_types)
+    if REPORT_FORMAT == "pdf":
+        for report_type in report_types:
+            REPORT_GENERATORS[report_type](populations[report_type], output_folder_path, dimensions=dimensions)
+        return
+    eeid_counts = pd.concat([pd.Series(df['EEID'].unique()) for df in populations.values()]).value_counts()
+    shared_eeids = set(eeid_counts.index[eeid_counts > 1])
+    print(f"{len(shared_eeids)} users appear in more than one report; their charts are rendered once.")
+    with tempfile.TemporaryDirectory(prefix="shared_charts_") as folder:
+        shared_charts = {'folder': folder, 'eeids': shared_eeids}
+        for report_type in report_types:
+            REPORT_GENERATORS[report_type](populations[report_type], output_folder_path, shared_charts=shared_charts, dimensions=dimensions)
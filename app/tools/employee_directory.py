@@ -0,0 +1,148 @@
+"""
+Employee directory (name and Reports_To) lookups for a report run.
+
+The directory is resolved once per run, from the already loaded DataFrame
+and/or a single set-based query, and then served from memory. A small JSON
+cache keeps the resolved entries between runs; it is read once per process
+and only written back when an entry changed.
+"""
+import json
+import time
+from typing import Dict, Iterable, Optional
+import pandas as pd
+from sqlalchemy import bindparam, text
+from tools.connections import alchemy_connection
+from tools.config import DIRECTORY_CACHE_FILE, DIRECTORY_CACHE_MAX_AGE_DAYS
+
+# EEID -> {"name": "First Last", "reports_to": "Manager", "updated": epoch seconds}
+_DIRECTORY: Dict[str, dict] = {}
+# Whether the persistent cache was merged in, and whether _DIRECTORY has entries it lacks
+_CACHE_LOADED = False
+_CHANGED = False
+
+# SQL Server accepts at most 2100 parameters per statement
+QUERY_CHUNK_SIZE = 1000
+
+def _title(value) -> Optional[str]:
+    """Returns the value title-cased as retrieve_username did, or None if missing."""
+    if value is None or pd.isna(value):
+        return None
+    return str(value).title()
+
+def _make_entry(fname, lname, reports_to) -> dict:
+    first, last = _title(fname), _title(lname)
+    name = f"{first} {last}" if first is not None and last is not None else None
+    return {"name": name, "reports_to": _title(reports_to), "updated": time.time()}
+
+def directory_from_dataframe(df: pd.DataFrame) -> Dict[str, dict]:
+    """Builds directory entries from the FName/LName/Reports_To columns of a loaded frame."""
+    needed = ['EEID', 'FName', 'LName', 'Reports_To']
+    if df is None or df.empty or not set(needed).issubset(df.columns):
+        return {}
+    # 'first' skips nulls, so each EEID gets its first known value per column
+    people = df[needed].groupby('EEID', sort=False).first()
+    return {
+        eeid: _make_entry(row.FName, row.LName, row.Reports_To)
+        for eeid, row in zip(people.index, people.itertuples(index=False))
+    }
+
+def fetch_directory(conn, eeids: Iterable[str]) -> Dict[str, dict]:
+    """Resolves names and managers for many EEIDs with one grouped query per chunk."""
+    eeids = list(eeids)
+    query = text("""
+                SELECT Employee_ID, MAX(FName) AS FName, MAX(LName) AS LName, MAX(Reports_To) AS Reports_To
+                FROM vw_VT_DailyEEHoursSummary
+                WHERE Employee_ID IN :eeids
+                GROUP BY Employee_ID;
+                """).bindparams(bindparam('eeids', expanding=True))
+    entries = {}
+    for start in range(0, len(eeids), QUERY_CHUNK_SIZE):
+        chunk = eeids[start:start + QUERY_CHUNK_SIZE]
+        for eeid, fname, lname, reports_to in conn.execute(query, {'eeids': chunk}):
+            entries[eeid] = _make_entry(fname, lname, reports_to)
+    return entries
+
+def load_directory_cache(cache_file=DIRECTORY_CACHE_FILE, max_age_days=DIRECTORY_CACHE_MAX_AGE_DAYS) -> Dict[str, dict]:
+    """Reads the persistent directory cache, dropping entries older than max_age_days."""
+    try:
+        with open(cache_file, encoding="utf-8") as f:
+            entries = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    oldest = time.time() - max_age_days * 86400
+    return {eeid: entry for eeid, entry in entries.items() if entry.get("updated", 0) >= oldest}
+
+def _set_entry(eeid, entry: dict):
+    """Stores an entry in the in-memory directory, noting whether its name or manager changed."""
+    global _CHANGED
+    current = _DIRECTORY.get(eeid)
+    if current is None or current.get("name") != entry.get("name") or current.get("reports_to") != entry.get("reports_to"):
+        _CHANGED = True
+    _DIRECTORY[eeid] = entry
+
+def save_directory_cache(cache_file=DIRECTORY_CACHE_FILE):
+    """Writes the in-memory directory to the persistent cache."""
+    global _CHANGED
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = cache_file.with_suffix(".tmp")
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(_DIRECTORY, f)
+        tmp_file.replace(cache_file)
+        _CHANGED = False
+    except OSError as e:
+        print(f"Could not write employee directory cache: {str(e)}")
+
+def load_employee_directory(eeids: Iterable[str], df: Optional[pd.DataFrame] = None, conn=None) -> Dict[str, dict]:
+    """
+    Resolves every EEID of the run into the in-memory directory.
+
+    The loaded DataFrame takes precedence over the persistent cache, and only
+    the EEIDs found in neither are queried from the database. The cache is
+    merged in on the first call only, under the entries already in memory.
+    """
+    global _CACHE_LOADED
+    eeids = set(eeids)
+    if not _CACHE_LOADED:
+        for eeid, entry in load_directory_cache().items():
+            _DIRECTORY.setdefault(eeid, entry)
+        _CACHE_LOADED = True
+    for eeid, entry in directory_from_dataframe(df).items():
+        _set_entry(eeid, entry)
+
+    missing = [eeid for eeid in eeids if eeid not in _DIRECTORY]
+    if missing:
+        print(f"Resolving {len(missing)} employee names from the database...")
+        own_conn = conn is None
+        if own_conn:
+            conn = alchemy_connection()
+        try:
+            for eeid, entry in fetch_directory(conn, missing).items():
+                _set_entry(eeid, entry)
+        finally:
+            if own_conn and conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    # Avoid masking the original exception
+                    pass
+
+    if _CHANGED:
+        save_directory_cache()
+    return {eeid: _DIRECTORY[eeid] for eeid in eeids if eeid in _DIRECTORY}
+
+def update_directory(entries: Dict[str, dict]):
+    """Merges resolved entries (or single fields of them) into the in-memory directory."""
+    for eeid, entry in entries.items():
+        merged = dict(_DIRECTORY.get(eeid, {"name": None, "reports_to": None}))
+        merged.update(entry)
+        merged.setdefault("updated", time.time())
+        _set_entry(eeid, merged)
+
+def lookup_user_name(eeid) -> Optional[str]:
+    """Returns the cached 'First Last' name for an EEID, or None if unknown."""
+    return _DIRECTORY.get(eeid, {}).get("name")
+
+def lookup_reports_to(eeid) -> Optional[str]:
+    """Returns the cached Reports_To value for an EEID, or None if unknown."""
+    return _DIRECTORY.get(eeid, {}).get("reports_to")
@@ -0,0 +1,164 @@
+"""
+Local Parquet cache of vw_VT_DailyEEHoursSummary extracts, partitioned by day.
+
+Each report population (query filter and aggregation mode) has its own cache
+folder with one partition per AT_Date:
+
+    <EXTRACT_CACHE_PATH>/<scope>/AT_Date=2026-01-05/part.parquet
+
+load_data_cached works out which days of the requested range are missing or
+still unsettled, fetches only those from the database (one query per
+contiguous range of days, or concurrent slices of it with EXTRACT_SPLIT,
+see tools.partitioned_extract), and serves the whole range from disk with column
+and predicate pushdown.
+"""
+import hashlib
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import List, Optional
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from tools.config import EXTRACT_CACHE_PATH, EXTRACT_CACHE_RETENTION_DAYS, EXTRACT_CACHE_SETTLE_DAYS, EXTRACT_SPLIT, RAW_HOUR_COLUMNS, RAW_HOUR_DTYPE, LEAN_HOUR_DTYPE, LEAN_STRING_DTYPE
+from tools.dataprocessing import generate_query, report_population_key, is_multi_report, load_data, LEAN_STRING_COLUMNS
+from tools.partitioned_extract import load_data_partitioned
+
+PARTITION_FILE = "part.parquet"
+# concat_tables takes promote_options from pyarrow 14; older versions only know promote=True
+PROMOTE_KWARGS = {"promote_options": "permissive"} if int(pa.__version__.split(".")[0]) >= 14 else {"promote": True}
+
+def cache_scope(report_type, aggregate: bool) -> str:
+    """Returns the cache folder name of a report population (or of a multi-report pull, for a list of types)."""
+    report_types = report_type if is_multi_report(report_type) else [report_type]
+    key = "|".join(report_population_key(t) for t in report_types)
+    if is_multi_report(report_type):
+        key = f"multi|{key}"
+    key = f"{key}|aggregate={aggregate}"
+    return f"type{''.join(str(t) for t in report_types)}_{hashlib.sha1(key.encode('utf-8')).hexdigest()[:12]}"
+
+def partition_path(scope_path: Path, day: pd.Timestamp) -> Path:
+    return scope_path / f"AT_Date={day.strftime('%Y-%m-%d')}" / PARTITION_FILE
+
+def is_fresh(path: Path, day: pd.Timestamp, settle_days: int = EXTRACT_CACHE_SETTLE_DAYS) -> bool:
+    """
+    A partition is fresh when it exists and was fetched at least settle_days
+    after its day, i.e. once the hours of that day were no longer changing.
+    """
+    if not path.exists():
+        return False
+    fetched_at = pd.Timestamp(path.stat().st_mtime, unit="s")
+    return fetched_at >= day + pd.Timedelta(days=settle_days)
+
+def days_to_fetch(scope_path: Path, start_date, end_date) -> List[pd.Timestamp]:
+    """Returns the days of the range that are missing from the cache or stale."""
+    days = pd.date_range(pd.Timestamp(start_date).normalize(), pd.Timestamp(end_date).normalize(), freq="D")
+    return [day for day in days if not is_fresh(partition_path(scope_path, day), day)]
+
+def contiguous_ranges(days: List[pd.Timestamp]) -> List[tuple]:
+    """Groups sorted days into (first_day, last_day) ranges of consecutive days."""
+    ranges = []
+    for day in days:
+        if ranges and day - ranges[-1][1] == pd.Timedelta(days=1):
+            ranges[-1] = (ranges[-1][0], day)
+        else:
+            ranges.append((day, day))
+    return ranges
+
+def write_partitions(scope_path: Path, df: pd.DataFrame, date_column: str, days: List[pd.Timestamp]):
+    """Writes one partition per requested day; days without rows get an empty partition."""
+    dates = pd.to_datetime(df[date_column]).dt.normalize()
+    for day in days:
+        path = partition_path(scope_path, day)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        df[dates == day].to_parquet(tmp_path, index=False)
+        tmp_path.replace(path)
+
+def evict_partitions(scope_path: Path, retention_days: int = EXTRACT_CACHE_RETENTION_DAYS) -> int:
+    """
+    Deletes the partitions that were neither written nor read in the last
+    retention_days days (the modification time of their folder, see
+    read_partitions), so old ranges that are still reported on stay cached.
+    Returns how many were removed.
+    """
+    if not scope_path.exists():
+        return 0
+    oldest = time.time() - retention_days * 86400
+    removed = 0
+    for folder in scope_path.glob("AT_Date=*"):
+        if folder.stat().st_mtime < oldest:
+            shutil.rmtree(folder, ignore_errors=True)
+            removed += 1
+    return removed
+
+def read_partitions(scope_path: Path, start_date, end_date, columns: Optional[List[str]] = None, filters=None) -> pd.DataFrame:
+    """
+    Reads the cached days of the range.
+
+    Only the partitions of the range are opened (partition pruning); columns
+    and filters (pyarrow filter tuples, e.g. [('Employee_ID', 'in', ids)])
+    are pushed down to the Parquet reader. The folder of every partition read
+    is touched, which marks it as used for evict_partitions; the file keeps
+    its fetch time for is_fresh.
+    """
+    days = pd.date_range(pd.Timestamp(start_date).normalize(), pd.Timestamp(end_date).normalize(), freq="D")
+    tables = []
+    for path in (partition_path(scope_path, day) for day in days):
+        if path.exists():
+            tables.append(pq.read_table(path, columns=columns, filters=filters))
+            os.utime(path.parent)
+    if not tables:
+        return pd.DataFrame(columns=columns)
+    return pa.concat_tables(tables, **PROMOTE_KWARGS).to_pandas()
+
+def typed_partitions(df: pd.DataFrame, lean: bool = False) -> pd.DataFrame:
+    """
+    Gives cached rows the column types load_data(..., lean=lean) returns.
+    Partitions keep the types of the run that fetched them, so a lean run
+    may read days cached by a classic run and the other way round.
+    """
+    types = {col: LEAN_HOUR_DTYPE if lean else RAW_HOUR_DTYPE for col in RAW_HOUR_COLUMNS if col in df.columns}
+    strings = [col for col in LEAN_STRING_COLUMNS if col in df.columns]
+    if lean:
+        types.update({col: LEAN_STRING_DTYPE for col in strings})
+    else:
+        # Back to the plain string columns of a classic fetch
+        types.update({col: object for col in strings if df[col].dtype == LEAN_STRING_DTYPE})
+    df = df.astype(types)
+    return df if lean else df.infer_objects()
+
+def load_data_cached(conn, report_type, start_date, end_date, aggregate: bool = False, columns: Optional[List[str]] = None, filters=None, lean: bool = False) -> pd.DataFrame:
+    """
+    Loads the report data for a date range through the local extract cache.
+
+    Only missing or stale days are fetched from the database; the result has
+    the same columns as load_data(conn, generate_query(...)) would return,
+    with the lean column types when lean=True (see typed_partitions).
+    """
+    scope_path = Path(EXTRACT_CACHE_PATH) / cache_scope(report_type, aggregate)
+    date_column = "Date" if aggregate else "AT_Date"
+
+    evicted = evict_partitions(scope_path)
+    if evicted:
+        print(f"Evicted {evicted} cached days not used in {EXTRACT_CACHE_RETENTION_DAYS} days")
+
+    missing = days_to_fetch(scope_path, start_date, end_date)
+    if missing:
+        ranges = contiguous_ranges(missing)
+        print(f"Fetching {len(missing)} uncached days in {len(ranges)} ranges...")
+        for first_day, last_day in ranges:
+            if EXTRACT_SPLIT:
+                df = load_data_partitioned(conn.engine, report_type, first_day, last_day, aggregate=aggregate, lean=lean)
+            else:
+                query = generate_query(report_type=report_type, start_date=first_day, end_date=last_day, aggregate=aggregate, conn=conn)
+                df = load_data(conn, query, lean=lean)
+            write_partitions(scope_path, df, date_column, pd.date_range(first_day, last_day, freq="D"))
+    else:
+        print("Every requested day is served from the local cache")
+
+    start_time = time.perf_counter()
+    df = typed_partitions(read_partitions(scope_path, start_date, end_date, columns=columns, filters=filters), lean)
+    print(f"Read {len(df)} cached rows in {time.perf_counter() - start_time:.1f}s")
+    return df
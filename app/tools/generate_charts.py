@@ -1,12 +1,38 @@
 """Data processing utilities for the GapDaysReports application."""
+import io
+import os
+import shutil
 import pandas as pd
 import plotly.graph_objects as go
 from pathlib import Path
+from PIL import Image
 from tools.utils import hours_to_hhmm
-from tools.config import CHART_COLUMNS, PROD_COLORS
+from tools.config import CHART_COLUMNS, PROD_COLORS, CHART_BACKEND
+from tools.chart_renderer import render_figures
+from tools import mpl_charts
+from tools.png_report_generator import load_report_images, chart_slot_sizes
 
-def weekly_bar_chart(df: pd.DataFrame, output_folder_path: str) -> go.Figure:
-    """Generates a stacked bar chart for the given DataFrame."""
+# Export size (layout pixels) and scale of the chart images
+WEEKLY_CHART_SIZE = (1400, 850)
+DAILY_CHART_SIZE = (1400, 700)
+CHART_SCALE = 2
+
+def report_chart_slots(description_text: tuple, num_weeks: int):
+    """Sizes (pixels) of the weekly and of the daily chart slots of a report (see png_report_generator.chart_slot_sizes)."""
+    return chart_slot_sizes(description_text, num_weeks, WEEKLY_CHART_SIZE, DAILY_CHART_SIZE)
+
+def slot_layout(chart_size: tuple, slot_size: tuple) -> tuple:
+    """
+    (width, height, scale) that rasterise a chart at exactly slot_size. The
+    scale fits the chart size into the slot and the layout grows along the
+    other side to the aspect ratio of the slot, so the margins and fonts
+    keep their size and the chart is not stretched by the compositor.
+    """
+    scale = min(slot_size[0] / chart_size[0], slot_size[1] / chart_size[1])
+    return slot_size[0] / scale, slot_size[1] / scale, scale
+
+def build_weekly_bar_chart(df: pd.DataFrame) -> go.Figure:
+    """Builds the weekly stacked bar chart for the given DataFrame."""
     fig = go.Figure()
 
     for col in CHART_COLUMNS:
@@ -106,13 +132,18 @@ def weekly_bar_chart(df: pd.DataFrame, output_folder_path: str) -> go.Figure:
             ay=-10,
             font=dict(size=28, color="#CE089C")
         )
+    return fig
+
+def weekly_bar_chart(df: pd.DataFrame, output_folder_path: str) -> go.Figure:
+    """Generates a stacked bar chart for the given DataFrame."""
+    fig = build_weekly_bar_chart(df)
     # Save as high-definition PNG
     output_path = Path(f"{output_folder_path}/weekly_productive_hours.png").resolve()
-    fig.write_image(str(output_path), width=1400, height=850, scale=2)
-
+    render_figures([fig], [output_path], *WEEKLY_CHART_SIZE, scale=CHART_SCALE)
+    return fig
 
-def daily_bar_chart(df: pd.DataFrame, output_folder_path: str, week: pd.Timestamp, name: str) -> go.Figure:
-    """Generates a daily chart for a specific EEID."""
+def build_daily_bar_chart(df: pd.DataFrame, week: pd.Timestamp) -> go.Figure:
+    """Builds the daily chart of one week for a specific EEID."""
 
     fig = go.Figure()
 
@@ -203,6 +234,112 @@ def daily_bar_chart(df: pd.DataFrame, output_folder_path: str, week: pd.Timestam
             font=dict(size=28, color="#CE089C" if j == len(df) - 1 else "#0FB9B1")
         )
 
+    return fig
+
+def daily_bar_chart(df: pd.DataFrame, output_folder_path: str, week: pd.Timestamp, name: str) -> go.Figure:
+    """Generates a daily chart for a specific EEID."""
+    fig = build_daily_bar_chart(df, week)
     # Save as high-definition PNG
     output_path = Path(f"{output_folder_path}/{name}.png").resolve()
-    fig.write_image(str(output_path), width=1400, height=700, scale=2)
+    render_figures([fig], [output_path], *DAILY_CHART_SIZE, scale=CHART_SCALE)
+    return fig
+
+def _plotly_user_charts(weekly_user_df: pd.DataFrame, week_frames: list, targets: list, layouts: list) -> list:
+    """Plotly backend: builds the figures and renders them in one batch on the warm renderer."""
+    figures = [build_weekly_bar_chart(weekly_user_df)]
+    figures += [build_daily_bar_chart(week_time_df, week) for week, week_time_df in week_frames]
+    widths, heights, scales = (list(values) for values in zip(*layouts))
+    outputs = render_figures(figures, targets, widths, heights, scale=scales)
+    return [_decode_png(data) if data is not None else None for data in outputs]
+
+def _decode_png(data: bytes) -> Image.Image:
+    with Image.open(io.BytesIO(data)) as image:
+        return image.convert("RGB")
+
+def _matplotlib_user_charts(weekly_user_df: pd.DataFrame, week_frames: list, targets: list, layouts: list) -> list:
+    """Matplotlib Agg backend: draws the same charts in-process, without Chromium."""
+    images = [mpl_charts.weekly_bar_chart(weekly_user_df, targets[0], *layouts[0])]
+    for (week, week_time_df), target, layout in zip(week_frames, targets[1:], layouts[1:]):
+        images.append(mpl_charts.daily_bar_chart(week_time_df, week, target, *layout))
+    return images
+
+# Chart backends: name -> function(weekly_user_df, week_frames, targets, layouts).
+# A None target means the chart is returned as a Pillow image instead of written to disk;
+# layouts holds the (width, height, scale) of each chart (weekly first).
+CHART_BACKENDS = {
+    "plotly": _plotly_user_charts,
+    "matplotlib": _matplotlib_user_charts,
+}
+
+_chart_backend = CHART_BACKEND
+
+def set_chart_backend(name: str):
+    """Selects the chart backend used by user_charts for the rest of the run."""
+    global _chart_backend
+    if name not in CHART_BACKENDS:
+        raise ValueError(f"Unknown chart backend '{name}'. Available: {', '.join(CHART_BACKENDS)}")
+    _chart_backend = name
+
+def get_chart_backend() -> str:
+    """Returns the name of the selected chart backend."""
+    return _chart_backend
+
+def user_charts(weekly_user_df: pd.DataFrame, week_frames: list, output_folder_path: str, backend: str = None) -> list:
+    """
+    Renders the weekly chart and every daily chart of a user with the selected backend.
+
+    week_frames holds (week, week_time_df) pairs in chronological order. The
+    files keep the names weekly_bar_chart and daily_bar_chart would write.
+    """
+    targets = [Path(f"{output_folder_path}/weekly_productive_hours.png").resolve()]
+    targets += [Path(f"{output_folder_path}/daily_productive_hours_week{i + 1}.png").resolve() for i in range(len(week_frames))]
+    layouts = [(*WEEKLY_CHART_SIZE, CHART_SCALE)] + [(*DAILY_CHART_SIZE, CHART_SCALE)] * len(week_frames)
+    _get_backend(backend)(weekly_user_df, week_frames, targets, layouts)
+    return targets
+
+def user_chart_images(weekly_user_df: pd.DataFrame, week_frames: list, slot_sizes: tuple, backend: str = None):
+    """
+    Renders the charts of a user in memory.
+
+    Returns (weekly_image, daily_images) as RGB Pillow images, with the daily
+    images in the order of week_frames; nothing is written to disk. The
+    charts are rasterised at the size of their slot in the report
+    (slot_sizes, see report_chart_slots), so the compositor pastes them as
+    they are.
+    """
+    weekly_slot, daily_slot = slot_sizes
+    layouts = [slot_layout(WEEKLY_CHART_SIZE, weekly_slot)] + [slot_layout(DAILY_CHART_SIZE, daily_slot)] * len(week_frames)
+    images = _get_backend(backend)(weekly_user_df, week_frames, [None] * (len(week_frames) + 1), layouts)
+    return images[0], images[1:]
+
+def shared_user_chart_images(weekly_user_df: pd.DataFrame, week_frames: list, slot_sizes: tuple, shared_folder, key: str, backend: str = None):
+    """
+    Like user_chart_images, but shares the charts between the reports of a run.
+
+    key identifies the chart inputs (e.g. a fingerprint of the user's data,
+    backend and slot sizes). The first report that needs the charts renders them and saves
+    them under shared_folder/key; later reports with the same key, in this or
+    another worker process, load them instead of rendering again.
+    """
+    folder = Path(shared_folder) / key
+    if (folder / "weekly_productive_hours.png").exists():
+        return load_report_images(folder)
+    weekly_image, daily_images = user_chart_images(weekly_user_df, week_frames, slot_sizes, backend)
+    tmp_folder = Path(shared_folder) / f"{key}.{os.getpid()}.tmp"
+    tmp_folder.mkdir(parents=True, exist_ok=True)
+    # Fast, lossless encode: these files only live for the run
+    weekly_image.save(tmp_folder / "weekly_productive_hours.png", compress_level=1)
+    for i, image in enumerate(daily_images):
+        image.save(tmp_folder / f"daily_productive_hours_week{i + 1}.png", compress_level=1)
+    try:
+        tmp_folder.rename(folder)
+    except OSError:
+        # Another process shared the same charts first
+        shutil.rmtree(tmp_folder, ignore_errors=True)
+    return weekly_image, daily_images
+
+def _get_backend(backend: str = None):
+    backend = backend or _chart_backend
+    if backend not in CHART_BACKENDS:
+        raise ValueError(f"Unknown chart backend '{backend}'. Available: {', '.join(CHART_BACKENDS)}")
+    return CHART_BACKENDS[backend]
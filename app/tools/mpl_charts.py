@@ -0,0 +1,120 @@
+"""
+Matplotlib (Agg) chart backend.
+
+Draws the same weekly and daily charts as the plotly backend, with the same
+colors and columns, without going through headless Chromium. Figures are
+created through the object API (no pyplot), so no global state is kept
+between charts and the module is safe to use in worker processes.
+"""
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.lines import Line2D
+from PIL import Image
+from tools.utils import hours_to_hhmm
+from tools.config import CHART_COLUMNS, PROD_COLORS, LEGEND_PATCHES
+
+# 100 dpi per unit of scale keeps the plotly pixel sizes: 1400x850 at scale 2 -> 2800x1700
+DPI_PER_SCALE = 100
+
+def _pt(px: float, zoom: float = 1.0) -> float:
+    """Converts a plotly font size (layout pixels) to points at DPI_PER_SCALE, times zoom."""
+    return px * 72 / DPI_PER_SCALE * zoom
+
+def _new_figure(width: int, height: int, scale: float) -> Figure:
+    fig = Figure(figsize=(width / DPI_PER_SCALE, height / DPI_PER_SCALE), dpi=DPI_PER_SCALE * scale)
+    FigureCanvasAgg(fig)
+    return fig
+
+def _stacked_bars(ax, x, df: pd.DataFrame, width: float):
+    bottom = np.zeros(len(df))
+    for col in CHART_COLUMNS:
+        values = df[col].to_numpy(dtype=float)
+        ax.bar(x, values, width, bottom=bottom, color=PROD_COLORS[col], label=col)
+        bottom += values
+    return bottom
+
+def _style_axes(ax, linewidth: float):
+    for side in ("top", "right"):
+        ax.spines[side].set_visible(False)
+    for side in ("left", "bottom"):
+        ax.spines[side].set_linewidth(linewidth)
+    ax.grid(axis="y", color="#EBF0F8")
+    ax.set_axisbelow(True)
+
+def _save(fig: Figure, output_path):
+    """Writes the figure to output_path, or returns it as an RGB Pillow image when output_path is None."""
+    if output_path is None:
+        canvas = fig.canvas
+        canvas.draw()
+        return Image.frombuffer("RGBA", canvas.get_width_height(), canvas.buffer_rgba(), "raw", "RGBA", 0, 1).convert("RGB")
+    fig.savefig(output_path, format=Path(output_path).suffix.lstrip(".") or "png", facecolor="white")
+    return None
+
+def weekly_bar_chart(df: pd.DataFrame, output_path, width: int = 1400, height: int = 850, scale: float = 2):
+    """Draws the weekly stacked bar chart with the daily productive average line (to output_path, or returned as an image if None)."""
+    fig = _new_figure(width, height, scale)
+    draw_weekly_chart(fig, df, width, height)
+    return _save(fig, output_path)
+
+def daily_bar_chart(df: pd.DataFrame, week: pd.Timestamp, output_path, width: int = 1400, height: int = 700, scale: float = 2):
+    """Draws the daily chart of one week, with the accumulated average line (to output_path, or returned as an image if None)."""
+    fig = _new_figure(width, height, scale)
+    draw_daily_chart(fig, df, week, width, height)
+    return _save(fig, output_path)
+
+def draw_weekly_chart(fig, df: pd.DataFrame, width: float, height: float, zoom: float = 1.0):
+    """
+    Draws the weekly chart on fig, a Figure or a SubFigure of width x height
+    pixels at DPI_PER_SCALE per inch. zoom scales the margins, fonts and lines, so a chart drawn
+    in a smaller box (e.g. a slot of a vector PDF page) keeps its proportions.
+    """
+    ax = fig.add_axes([150 * zoom / width, 230 * zoom / height, 1 - 170 * zoom / width, 1 - 310 * zoom / height])
+    x = np.arange(len(df))
+    totals = _stacked_bars(ax, x, df, 0.8)
+    averages = df['Daily Productive Average'].to_numpy(dtype=float)
+    ax.plot(x, averages, color="#CE089C", linewidth=4 * 0.72 * zoom, marker="o", markersize=6 * zoom)
+
+    for i in range(len(df)):
+        ax.annotate(hours_to_hhmm(df['Total Hours'].iloc[i]), (x[i], df['Total Hours'].iloc[i]), textcoords="offset points", xytext=(0, 8 * zoom), ha="center", fontsize=_pt(28, zoom))
+        ax.annotate(hours_to_hhmm(averages[i]), (x[i], averages[i]), textcoords="offset points", xytext=(0, 8 * zoom), ha="center", fontsize=_pt(28, zoom), color="#CE089C")
+
+    weeks = pd.to_datetime(df['Week'])
+    ax.set_xticks(x, [f"{start.strftime('%b %d')} - {(start + pd.Timedelta(days=6)).strftime('%b %d')}" for start in weeks], fontsize=_pt(28, zoom))
+    top = int(max(totals.max(initial=0), averages.max(initial=0))) + 2
+    ticks = list(range(0, top, 3))
+    ax.set_yticks(ticks, [hours_to_hhmm(h) for h in ticks], fontsize=_pt(24, zoom))
+    ax.set_ylim(0, top * 1.08)
+    ax.set_xlabel("Week", fontsize=_pt(28, zoom))
+    ax.set_ylabel("Hours", fontsize=_pt(28, zoom))
+    _style_axes(ax, 3 * 0.72 * zoom)
+    fig.suptitle(f"Weekly Productive Hours ({min(weeks).strftime('%b %d, %Y')} - {(max(weeks) + pd.Timedelta(days=6)).strftime('%b %d, %Y')})", fontsize=_pt(32, zoom), fontweight="bold")
+    handles = LEGEND_PATCHES + [Line2D([], [], color="#CE089C", linewidth=3 * zoom, marker="o", markersize=6 * zoom, label="Daily Productive Average per Week")]
+    fig.legend(handles=handles, loc="lower center", ncol=4, fontsize=_pt(21, zoom), frameon=False)
+
+def draw_daily_chart(fig, df: pd.DataFrame, week: pd.Timestamp, width: float, height: float, zoom: float = 1.0):
+    """Draws the daily chart of one week on fig (see draw_weekly_chart for width, height and zoom)."""
+    ax = fig.add_axes([150 * zoom / width, 180 * zoom / height, 1 - 170 * zoom / width, 1 - 260 * zoom / height])
+    x = np.arange(len(df))
+    totals = _stacked_bars(ax, x, df, 0.8)
+    acc_avg = df['Daily Productive Accumulated Average'].to_numpy(dtype=float)
+    ax.plot(x, acc_avg, color="#0FB9B1", linewidth=3 * 0.72 * zoom, marker="o", markersize=6 * zoom)
+
+    for j in range(len(df)):
+        if df['Total Hours'].iloc[j] == 0:
+            ax.annotate("↓", (x[j], 1), ha="center", fontsize=_pt(60, zoom), color="red")
+        ax.annotate(hours_to_hhmm(acc_avg[j]), (x[j], acc_avg[j]), textcoords="offset points", xytext=(0, 8 * zoom), ha="center", fontsize=_pt(28, zoom), color="#CE089C" if j == len(df) - 1 else "#0FB9B1")
+
+    ax.set_xticks(x, [date.strftime('%a, %b %e') for date in pd.to_datetime(df['Date'])], fontsize=_pt(24, zoom))
+    top = int(max(totals.max(initial=0), acc_avg.max(initial=0))) + 2
+    ticks = list(range(0, top))
+    ax.set_yticks(ticks, [hours_to_hhmm(h) for h in ticks], fontsize=_pt(24, zoom))
+    ax.set_ylim(0, top * 1.08)
+    ax.set_xlabel("Day", fontsize=_pt(24, zoom))
+    ax.set_ylabel("Hours", fontsize=_pt(24, zoom))
+    _style_axes(ax, 2 * 0.72 * zoom)
+    fig.suptitle(f"Daily Productive Hours for the Week Between {week.strftime('%b %d, %Y')} and {(week + pd.Timedelta(days=6)).strftime('%b %d, %Y')}", fontsize=_pt(34, zoom))
+    handles = LEGEND_PATCHES + [Line2D([], [], color="#0FB9B1", linewidth=3 * zoom, marker="o", markersize=6 * zoom, label="Daily Productive Accumulated Average")]
+    fig.legend(handles=handles, loc="lower center", ncol=4, fontsize=_pt(14, zoom), frameon=False)
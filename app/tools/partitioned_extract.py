@@ -0,0 +1,105 @@
+"""
+Concurrent extraction of vw_VT_DailyEEHoursSummary in slices.
+
+A single BETWEEN query streams over one connection, so a long range is
+bound by the throughput of that connection. load_data_partitioned splits
+the requested range into day or week slices, or into hash buckets of
+Employee_ID, fetches the slices concurrently, each on its own connection
+checked out of the pooled engine, and concatenates them in slice order.
+
+EXTRACT_WORKERS bounds how many slices run on the server at once: raise it
+for long ranges on an idle server, lower it when the reports run next to
+other workloads. Slices wait for a free connection when it exceeds the pool
+(DB_POOL_SIZE + DB_POOL_MAX_OVERFLOW). Every slice runs its own query with
+the same filters, so an EEID temp table (load_eeid_table) is loaded once
+per slice. An eeid bucket scans the whole date range on the server, so day
+or week slices suit long ranges better.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+import pandas as pd
+from tools.config import EXTRACT_SPLIT, EXTRACT_WORKERS, EXTRACT_EEID_BUCKETS
+from tools.dataprocessing import generate_query, load_data
+
+EXTRACT_SPLITS = ("day", "week", "eeid")
+
+# Hash bucket condition of an Employee_ID per SQL dialect. SQLite (the
+# benchmark stand-in for the view) has no hash function and buckets on the
+# code point of the last character
+EEID_BUCKET_CONDITIONS = {
+    "mssql": "(CHECKSUM(Employee_ID) & 2147483647) % :eeid_buckets = :eeid_bucket",
+    "sqlite": "unicode(substr(Employee_ID, -1)) % :eeid_buckets = :eeid_bucket",
+}
+
+def date_slices(start_date, end_date, split: str = "day") -> List[tuple]:
+    """(first, last) dates of the slices of the range: single days or Sunday to Saturday report weeks, clipped to the range."""
+    start_date, end_date = pd.Timestamp(start_date), pd.Timestamp(end_date)
+    slices = []
+    for day in pd.date_range(start_date.normalize(), end_date.normalize(), freq="D"):
+        if split == "week" and slices and day.dayofweek != 6:
+            slices[-1] = (slices[-1][0], day)
+        else:
+            slices.append((day, day))
+    if slices:
+        slices[0] = (start_date, slices[0][1])
+        slices[-1] = (slices[-1][0], end_date)
+    return slices
+
+def extract_slices(start_date, end_date, split: str, eeid_buckets: int = None) -> List[dict]:
+    """The slices of a partitioned extract, in merge order: their dates and EEID bucket (bucket, buckets) or None."""
+    if split not in EXTRACT_SPLITS:
+        raise ValueError(f"Unknown extract split '{split}'. Available: {', '.join(EXTRACT_SPLITS)}")
+    if split == "eeid":
+        buckets = eeid_buckets or EXTRACT_EEID_BUCKETS
+        return [{"start_date": start_date, "end_date": end_date, "bucket": (bucket, buckets)} for bucket in range(buckets)]
+    slices = [{"start_date": first, "end_date": last, "bucket": None} for first, last in date_slices(start_date, end_date, split)]
+    # An empty range still runs its (empty) query, for the columns
+    return slices or [{"start_date": start_date, "end_date": end_date, "bucket": None}]
+
+def eeid_bucket_filter(conn, bucket: int, buckets: int) -> tuple:
+    """slice_filter of generate_query selecting one hash bucket of Employee_ID on conn's database."""
+    condition = EEID_BUCKET_CONDITIONS.get(conn.dialect.name)
+    if condition is None:
+        raise ValueError(f"No EEID hash condition for the {conn.dialect.name} dialect; use a day or week split.")
+    return condition, {"eeid_bucket": bucket, "eeid_buckets": buckets}
+
+def fetch_slice(engine, report_type, extract_slice: dict, aggregate: bool = False, lean: bool = False) -> pd.DataFrame:
+    """Fetches one slice on a connection of its own, checked out of the engine's pool for the duration of the slice."""
+    with engine.connect() as conn:
+        slice_filter = eeid_bucket_filter(conn, *extract_slice["bucket"]) if extract_slice["bucket"] else None
+        query = generate_query(
+            report_type=report_type, start_date=extract_slice["start_date"], end_date=extract_slice["end_date"],
+            aggregate=aggregate, conn=conn, slice_filter=slice_filter,
+        )
+        return load_data(conn, query, verbose=False, lean=lean)
+
+def load_data_partitioned(engine, report_type, start_date, end_date, aggregate: bool = False, split: str = None,
+                          workers: int = None, eeid_buckets: int = None, lean: bool = False) -> pd.DataFrame:
+    """
+    Loads the report data for a date range in concurrent slices (split:
+    "day", "week" or "eeid", EXTRACT_SPLIT by default) over at most workers
+    pooled connections of engine. The result has the rows and columns of
+    load_data(conn, generate_query(...)) for the whole range, slice by slice.
+    """
+    split = split or EXTRACT_SPLIT or "day"
+    workers = max(1, EXTRACT_WORKERS if workers is None else workers)
+    slices = extract_slices(start_date, end_date, split, eeid_buckets)
+    start_time = time.perf_counter()
+    workers = min(workers, len(slices))
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        frames = list(executor.map(lambda extract_slice: fetch_slice(engine, report_type, extract_slice, aggregate, lean), slices))
+    finally:
+        # A failed slice cancels the slices that did not start yet
+        executor.shutdown(cancel_futures=True)
+    non_empty = [frame for frame in frames if len(frame)]
+    if len(non_empty) > 1:
+        df = pd.concat(non_empty, ignore_index=True).infer_objects()
+    else:
+        df = non_empty[0] if non_empty else frames[0]
+    elapsed = time.perf_counter() - start_time
+    rows_per_second = len(df) / elapsed if elapsed > 0 else float("inf")
+    print(f"Loaded {len(df)} rows in {len(slices)} {split} slices over {workers} connections "
+          f"({elapsed:.1f}s, {rows_per_second:,.0f} rows/s)")
+    return df
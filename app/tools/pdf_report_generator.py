@@ -1,64 +1,131 @@
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from reportlab.lib.units import cm
-from PIL import Image
+"""
+Multipage vector PDF reports.
+
+Every employee gets one page laid out like the PNG report
+(png_report_generator), with the charts drawn as vectors by the matplotlib
+chart code (mpl_charts) instead of embedded rasters. A PDF holds one
+employee, one manager's employees or the whole batch (PDF_GROUPINGS).
+
+The static description is written once, on the first page of each PDF, and
+the fonts are embedded once per file. write_pdf_report streams the pages:
+each page is drawn, written and released before the next one is built, so
+memory stays flat for batches of thousands of employees.
+"""
 from pathlib import Path
+from typing import Iterable
+import matplotlib
+from matplotlib.backends.backend_pdf import PdfPages
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from matplotlib.text import Annotation
+from tools import mpl_charts
+from tools.generate_charts import WEEKLY_CHART_SIZE, DAILY_CHART_SIZE
+from tools.png_report_generator import (
+    CANVAS_WIDTH, CANVAS_HEIGHT, PADDING, BG_COLOR, TEXT_COLOR, VALUE_COLOR,
+    TITLE_FONT_SIZE, INFO_FONT_SIZE, LEFT_WIDTH, TEXT_MAX_WIDTH, DAILY_SLOT_WIDTH,
+)
+from tools.profiling import stage
+
+# Layout pixels of the PNG report per inch of page: the 2600x1400 layout gives 13x7 in pages
+PAGE_PIXELS_PER_INCH = 200
+# Chart units (mpl_charts draws at DPI_PER_SCALE pixels per inch) per layout pixel
+CHART_UNITS = mpl_charts.DPI_PER_SCALE / PAGE_PIXELS_PER_INCH
+
+# One PDF per employee, per manager (Reports_To) or for the whole batch
+PDF_GROUPINGS = ("employee", "manager", "batch")
+
+def _pt(px: float) -> float:
+    """Converts a layout font size (pixels of the PNG report) to points on the page."""
+    return px * 72 / PAGE_PIXELS_PER_INCH
+
+def _new_page() -> Figure:
+    fig = Figure(figsize=(CANVAS_WIDTH / PAGE_PIXELS_PER_INCH, CANVAS_HEIGHT / PAGE_PIXELS_PER_INCH), facecolor=BG_COLOR)
+    FigureCanvasAgg(fig)
+    return fig
+
+def _chart_box(fig: Figure, x: float, y: float, width: float, height: float):
+    """SubFigure covering the box (layout pixels, y from the top of the page)."""
+    # Subfigures are placed by the grid ratios only (the gridspec margins are ignored)
+    grid = fig.add_gridspec(
+        3, 3,
+        width_ratios=[x, width, CANVAS_WIDTH - x - width],
+        height_ratios=[y, height, CANVAS_HEIGHT - y - height],
+        wspace=0, hspace=0,
+    )
+    return fig.add_subfigure(grid[1, 1])
 
-def create_report(images_folder, output_path, text_paragraph):
+def draw_description_page(title: str, description: str) -> Figure:
+    """First page of a PDF: the batch title and the static description, paragraphs split by '|'."""
+    fig = _new_page()
+    fig.text(0.5, 1 - PADDING / CANVAS_HEIGHT, title, ha="center", va="top", fontsize=_pt(TITLE_FONT_SIZE), color=TEXT_COLOR)
+    heading, *paragraphs = description.split("|")
+    top = 1 - (PADDING + TITLE_FONT_SIZE + 30) / CANVAS_HEIGHT
+    fig.text(PADDING / CANVAS_WIDTH, top, heading, va="top", fontsize=_pt(INFO_FONT_SIZE), fontweight="bold", color=TEXT_COLOR)
+    fig.text(
+        PADDING / CANVAS_WIDTH, top - (INFO_FONT_SIZE + 20) / CANVAS_HEIGHT, "\n\n".join(paragraphs),
+        va="top", fontsize=_pt(INFO_FONT_SIZE), color=TEXT_COLOR, wrap=True, linespacing=1.5,
+    )
+    return fig
+
+def draw_employee_page(title: str, employee_info: str, weekly_user_df, week_frames: list) -> Figure:
+    """
+    One employee's page: the title and the employee info (the info string of
+    create_text_parameters) on the left with the weekly chart below them, and
+    one daily chart per week of week_frames on the right.
     """
-    Create a PDF report with images and descriptive text.
-    
-    Args:
-        images_folder (str or Path): Path to folder containing PNG images
-        output_path (str or Path): Path where the PDF report will be saved
-        text_paragraph (str): Descriptive text to include in the report
+    fig = _new_page()
+    fig.text((PADDING + TEXT_MAX_WIDTH / 2) / CANVAS_WIDTH, 1 - PADDING / CANVAS_HEIGHT, title, ha="center", va="top", fontsize=_pt(TITLE_FONT_SIZE), color=TEXT_COLOR)
+    info_y = PADDING + TITLE_FONT_SIZE + 30
+    for info in employee_info.split("|"):
+        label, value = info.split(":", 1) if ":" in info else (info, None)
+        label_text = fig.text(PADDING / CANVAS_WIDTH, 1 - info_y / CANVAS_HEIGHT, label + (":" if value is not None else ""), va="top", fontsize=_pt(INFO_FONT_SIZE), color=TEXT_COLOR)
+        if value is not None:
+            # Positioned after the label, whatever its rendered width
+            fig.add_artist(Annotation(value, xy=(1, 1), xycoords=label_text, va="top", fontsize=_pt(INFO_FONT_SIZE), color=VALUE_COLOR))
+        info_y += INFO_FONT_SIZE + 6
+
+    # ---- WEEKLY CHART (bottom of the left column) ----
+    width = TEXT_MAX_WIDTH
+    height = min(WEEKLY_CHART_SIZE[1] * width / WEEKLY_CHART_SIZE[0], CANVAS_HEIGHT - info_y - 2 * PADDING)
+    zoom = min(width / WEEKLY_CHART_SIZE[0], height / WEEKLY_CHART_SIZE[1])
+    box = _chart_box(fig, PADDING, CANVAS_HEIGHT - height - PADDING, width, height)
+    mpl_charts.draw_weekly_chart(box, weekly_user_df, width * CHART_UNITS, height * CHART_UNITS, zoom * CHART_UNITS)
+
+    # ---- DAILY CHARTS (right column) ----
+    if week_frames:
+        width = DAILY_SLOT_WIDTH
+        slot_height = (CANVAS_HEIGHT - 5 * PADDING) // len(week_frames)
+        height = min(DAILY_CHART_SIZE[1] * width / DAILY_CHART_SIZE[0], slot_height)
+        zoom = min(width / DAILY_CHART_SIZE[0], height / DAILY_CHART_SIZE[1])
+        y = PADDING
+        for week, week_df in week_frames:
+            box = _chart_box(fig, LEFT_WIDTH + PADDING, y, width, height)
+            mpl_charts.draw_daily_chart(box, week_df, week, width * CHART_UNITS, height * CHART_UNITS, zoom * CHART_UNITS)
+            y += slot_height + PADDING
+    return fig
+
+def write_pdf_report(output_file, title: str, description: str, pages: Iterable[tuple]) -> int:
     """
-    images_folder = Path(images_folder)
-    output_path = Path(output_path)
-    
-    images_path = sorted(images_folder.glob("*.png"))
-    
-    c = canvas.Canvas(str(output_path), pagesize=A4)
-    width, height = A4
-    
-    y = height - 2 * cm
-    
-    # ---- ADD IMAGES ----
-    for img_path in images_path:
-        img = Image.open(img_path)
-        img_width, img_height = img.size
-        
-        aspect = img_height / img_width
-        display_width = width - 4 * cm
-        display_height = display_width * aspect
-        
-        if y - display_height < 2 * cm:
-            c.showPage()
-            y = height - 2 * cm
-        
-        c.drawImage(
-            str(img_path),
-            2 * cm,
-            y - display_height,
-            width=display_width,
-            height=display_height
-        )
-        
-        y -= display_height + 1 * cm
-    
-    # ---- ADD TEXT ----
-    text_object = c.beginText(2 * cm, y)
-    text_object.setFont("Helvetica", 11)
-    
-    for line in text_paragraph.split(". "):
-        text_object.textLine(line)
-    
-    c.drawText(text_object)
-    c.save()
+    Writes a multipage PDF: the description page, then one page per
+    (eeid, page_title, employee_info, weekly_user_df, week_frames) of pages.
 
-# Usage example:
-# create_report(
-#     images_folder="/path/to/images",
-#     output_path="/path/to/report.pdf",
-#     text_paragraph="Your descriptive text here."
-# )
+    pages may be a generator; every page is written before the next one is
+    requested. The file appears under its name only once complete. Returns
+    the number of employee pages.
+    """
+    output_file = Path(output_file)
+    tmp_file = output_file.with_name(f"{output_file.name}.tmp")
+    count = 0
+    try:
+        # TrueType fonts are embedded once per file (subset) and keep the text selectable
+        with matplotlib.rc_context({"pdf.fonttype": 42}), PdfPages(tmp_file, metadata={"Title": f"{title} - {output_file.stem}"}) as pdf:
+            pdf.savefig(draw_description_page(title, description))
+            for eeid, page_title, employee_info, weekly_user_df, week_frames in pages:
+                with stage("pdf_page", eeid=eeid):
+                    pdf.savefig(draw_employee_page(page_title, employee_info, weekly_user_df, week_frames))
+                count += 1
+        tmp_file.replace(output_file)
+    except BaseException:
+        tmp_file.unlink(missing_ok=True)
+        raise
+    return count
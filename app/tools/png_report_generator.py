@@ -1,121 +1,205 @@
 """
 Docstring for app.tools.report_generator
 """
+import re
+from functools import lru_cache
 from pathlib import Path
 from PIL import Image, ImageDraw, ImageFont
- 
-def generate_png_report(description_text:tuple, images_folder_path:str, output_path:str, output_name:str, num_weeks:int):
-    # ---- CONFIG ----
+from tools.profiling import stage
+from tools.report_encoding import save_report
+from tools.config import REPORT_RESAMPLING, REPORT_REDUCING_GAP
+
+# ---- CONFIG ----
+CANVAS_WIDTH = 2600
+CANVAS_HEIGHT = 1400
+PADDING = 30
+BG_COLOR = "white"
+TEXT_COLOR = "black"
+VALUE_COLOR = "#990073"
+REPORT_FONT = "arial.ttf"
+TITLE_FONT_SIZE = 50
+INFO_FONT_SIZE = 28
+DESC_FONT_SIZE = 22
+LEFT_WIDTH = int(CANVAS_WIDTH * 0.55)
+RIGHT_WIDTH = CANVAS_WIDTH - LEFT_WIDTH
+TEXT_MAX_WIDTH = LEFT_WIDTH - 2 * PADDING
+DAILY_SLOT_WIDTH = RIGHT_WIDTH - 2 * PADDING
+# Image.Resampling arrived in Pillow 9.1; older versions have the same filters as Image.BICUBIC, ...
+RESAMPLING = getattr(getattr(Image, "Resampling", Image), REPORT_RESAMPLING.upper())
+
+def load_report_images(images_folder_path: str):
+    """
+    Loads the charts written by generate_charts.user_charts from a folder.
+
+    Returns (weekly_image, daily_images) with the daily charts ordered by their
+    week number, so week10 comes after week9.
+    """
     images_folder = Path(images_folder_path)
-    canvas_width = 2600
-    canvas_height = 1400
-    padding = 30
-    bg_color = "white"
-    text_color = "black"
-
-    # ---- LOAD IMAGES ----
-    image_paths = sorted(images_folder.glob("*.png"))
-    if len(image_paths) < 5:
+    weekly_image = _load_rgb(images_folder / "weekly_productive_hours.png")
+    daily_paths = sorted(
+        images_folder.glob("daily_productive_hours_week*.png"),
+        key=lambda p: int(re.search(r"week(\d+)$", p.stem).group(1)),
+    )
+    daily_images = [_load_rgb(p) for p in daily_paths]
+    return weekly_image, daily_images
+
+def _load_rgb(path) -> Image.Image:
+    """Decodes an image file into memory and closes the file right away."""
+    with Image.open(path) as image:
+        return image.convert("RGB")
+
+def chart_slot_sizes(description_text: tuple, num_weeks: int, weekly_chart_size: tuple, daily_chart_size: tuple):
+    """
+    Sizes (pixels) of the weekly chart slot and of every daily chart slot of
+    a report with description_text and num_weeks weeks. A slot is as wide as
+    its column and as high as the chart (of the given size) at that width,
+    capped by the room left below the description (weekly chart) or by the
+    week's share of the right column (daily charts).
+    """
+    _, employee_info, description = description_text
+    _, description_bottom = report_template(description, len(employee_info.split("|")))
+    weekly_height = min(int(weekly_chart_size[1] * TEXT_MAX_WIDTH / weekly_chart_size[0]), CANVAS_HEIGHT - description_bottom - PADDING)
+    daily_height = min(int(daily_chart_size[1] * DAILY_SLOT_WIDTH / daily_chart_size[0]), daily_slot_spacing(num_weeks))
+    return (TEXT_MAX_WIDTH, weekly_height), (DAILY_SLOT_WIDTH, daily_height)
+
+def daily_slot_spacing(num_weeks: int) -> int:
+    """Height (pixels) of the right column's share of one week."""
+    return (CANVAS_HEIGHT - 5 * PADDING) // max(num_weeks, 1)
+
+def fit_image(image: Image.Image, size: tuple) -> Image.Image:
+    """
+    Resizes a chart to its slot with the REPORT_RESAMPLING filter. Charts
+    already rendered at the slot size are used as they are; large downscales
+    go through Image.reduce first (REPORT_REDUCING_GAP).
+    """
+    if image.size == size:
+        return image
+    return image.resize(size, RESAMPLING, reducing_gap=REPORT_REDUCING_GAP or None)
+
+def _paste(canvas: Image.Image, image: Image.Image, size: tuple, position: tuple):
+    fitted = fit_image(image, size)
+    canvas.paste(fitted, position)
+    if fitted is not image:
+        fitted.close()
+
+def generate_png_report(description_text:tuple, images_folder_path:str, output_path:str, output_name:str, num_weeks:int):
+    """Builds the report from the chart PNGs in images_folder_path (see compose_png_report)."""
+    weekly_image, daily_images = load_report_images(images_folder_path)
+    if len(daily_images) + 1 < 5:
         raise ValueError("At least 5 images are required.")
+    compose_png_report(description_text, weekly_image, daily_images[:num_weeks], output_path, output_name)
 
-    images = [Image.open(p).convert("RGB") for p in image_paths]
+def compose_png_report(description_text:tuple, weekly_image:Image.Image, daily_images:list, output_path:str, output_name:str, background:bool=False) -> Path:
+    """
+    Builds the report from in-memory chart images (see build_report_canvas)
+    and saves it in REPORT_FORMAT; returns the report path. With
+    background=True the file is encoded by the background pool (see
+    report_encoding.save_report).
+    """
+    canvas = build_report_canvas(description_text, weekly_image, daily_images)
+    return save_report(canvas, output_path, output_name, background=background)
 
-    # ---- CANVAS ----
-    canvas = Image.new("RGB", (canvas_width, canvas_height), bg_color)
-    draw = ImageDraw.Draw(canvas)
+# ---- FONTS AND TEXT MEASURES (cached for the whole run) ----
+@lru_cache(maxsize=None)
+def get_font(size=24):
+    return ImageFont.truetype(REPORT_FONT, size)
+
+@lru_cache(maxsize=65536)
+def text_width(text: str, size: int) -> float:
+    """Advance width of text in the report font at size."""
+    return get_font(size).getlength(text)
 
-    left_width = int(canvas_width * 0.55)
-    right_width = canvas_width - left_width
+def wrap_text(text: str, size: int, max_width: int) -> list:
+    """
+    Greedy word wrap with the line widths measured from cached word widths,
+    so a paragraph is measured in one linear pass.
+    """
+    space = text_width(" ", size)
+    lines = []
+    line = ""
+    line_width = 0.0
+    for word in text.split():
+        word_width = text_width(word, size) + space
+        if line_width + word_width <= max_width:
+            line = f"{line}{word} "
+            line_width += word_width
+        else:
+            lines.append(line)
+            line = f"{word} "
+            line_width = word_width
+    lines.append(line)
+    return lines
 
-    # ---- TEXT WRAPPING FUNCTION ----
-    def wrap_text(text, font, max_width):
-        words = text.split()
-        lines = []
-        line = ""
+# ---- TEMPLATE ----
+def description_top(info_lines: int) -> int:
+    """y coordinate where the description starts below the title and info_lines info lines."""
+    return PADDING + TITLE_FONT_SIZE + 30 + info_lines * (INFO_FONT_SIZE + 6) + 10
 
-        dummy_img = Image.new("RGB", (1, 1))
-        dummy_draw = ImageDraw.Draw(dummy_img)
+@lru_cache(maxsize=8)
+def report_template(description: str, info_lines: int):
+    """
+    Pre-renders the parts of the report that are the same for every employee
+    of a run: the blank canvas and the description block.
+
+    Returns (template, description_bottom). The template is shared; draw on a copy.
+    """
+    template = Image.new("RGB", (CANVAS_WIDTH, CANVAS_HEIGHT), BG_COLOR)
+    draw = ImageDraw.Draw(template)
+    desc_font = get_font(DESC_FONT_SIZE)
+    des_y_coor = description_top(info_lines)
+    for desc in description.split("|"):
+        for line in wrap_text(desc, DESC_FONT_SIZE, TEXT_MAX_WIDTH):
+            draw.text((PADDING, des_y_coor), line, fill=TEXT_COLOR, font=desc_font)
+            des_y_coor += DESC_FONT_SIZE + 6
+        des_y_coor += 10  # Extra space between paragraphs
+    return template, des_y_coor
 
-        for word in words:
-            test_line = f"{line}{word} "
-            if dummy_draw.textlength(test_line, font=font) <= max_width:
-                line = test_line
-            else:
-                lines.append(line)
-                line = f"{word} "
+@stage("composite")
+def build_report_canvas(description_text:tuple, weekly_image:Image.Image, daily_images:list) -> Image.Image:
+    """
+    Lays out the report text and the chart images on a copy of the run's template.
 
-        lines.append(line)
-        return lines
+    weekly_image goes at the bottom of the left column and daily_images are
+    stacked in the given order on the right column, one per week. Only the
+    title, the employee info and the charts are drawn per employee.
+    """
+    num_weeks = len(daily_images)
+    title, employee_info, description = description_text
+    employee_info_chuncks = employee_info.split("|")
+    template, des_y_coor = report_template(description, len(employee_info_chuncks))
+    canvas = template.copy()
+    draw = ImageDraw.Draw(canvas)
 
     # ================= LEFT COLUMN =================
-    # ---- FONT ----
-    def get_font(size=24):
-        return ImageFont.truetype("arial.ttf", size)
-    
-    text_max_width = left_width - 2 * padding
-    # ---- TEXT ----
-    title = description_text[0]
-    employee_info = description_text[1]
-    description = description_text[2]
     # ---- INSERT TITLE ----
-    title_font_size = 50
-    title_font = get_font(size=title_font_size)
-    dummy_img = Image.new("RGB", (1, 1))
-    dummy_draw = ImageDraw.Draw(dummy_img)
-    title_x_coor = (text_max_width - dummy_draw.textlength(title, font=title_font)) // 2 + padding
-    title_y_coor = padding
-    draw.text((title_x_coor, title_y_coor), title, fill=text_color, font=title_font)
+    title_font = get_font(TITLE_FONT_SIZE)
+    title_x_coor = (TEXT_MAX_WIDTH - text_width(title, TITLE_FONT_SIZE)) // 2 + PADDING
+    title_y_coor = PADDING
+    draw.text((title_x_coor, title_y_coor), title, fill=TEXT_COLOR, font=title_font)
     # ---- INSERT EMPLOYEE INFO ----
-    info_font_size = 28
-    info_font = get_font(size=info_font_size)
-    info_y_coor = title_y_coor + title_font_size + 30
-    employee_info_chuncks = employee_info.split("|")
+    info_font = get_font(INFO_FONT_SIZE)
+    info_y_coor = title_y_coor + TITLE_FONT_SIZE + 30
     for info in employee_info_chuncks:
         if ":" in info:
             label, value = info.split(":", 1)
-            draw.text((padding, info_y_coor), label + ":", fill="black", font=info_font)
+            draw.text((PADDING, info_y_coor), label + ":", fill=TEXT_COLOR, font=info_font)
             label_width = info_font.getbbox(label + ":")[2]
-            draw.text((padding + label_width, info_y_coor), value, fill="#990073", font=info_font)
+            draw.text((PADDING + label_width, info_y_coor), value, fill=VALUE_COLOR, font=info_font)
         else:
-            draw.text((padding, info_y_coor), info, fill="black", font=info_font)
-        info_y_coor += info_font_size + 6
-    # ---- INSERT DESCRIPTION ----
-    desc_font_size = 22
-    desc_font = get_font(size=desc_font_size)
-    des_y_coor = info_y_coor + 10
-    des_chuncks = description.split("|")
-    for desc in des_chuncks:
-        text_lines = wrap_text(desc, desc_font, text_max_width)
-        for line in text_lines:
-            draw.text((padding, des_y_coor), line, fill=text_color, font=desc_font)
-            des_y_coor += desc_font_size + 6
-        des_y_coor += 10  # Extra space between paragraphs
+            draw.text((PADDING, info_y_coor), info, fill=TEXT_COLOR, font=info_font)
+        info_y_coor += INFO_FONT_SIZE + 6
+
+    # Charts rendered for these slots (chart_slot_sizes) keep their size
+    weekly_size, daily_size = chart_slot_sizes(description_text, num_weeks, weekly_image.size, daily_images[0].size if daily_images else (1, 1))
 
     # ---- BOTTOM IMAGE (LEFT) ----
-    bottom_image = images[num_weeks]
-    available_height = canvas_height - des_y_coor - padding
-    img_ratio = text_max_width / bottom_image.width
-    img_height = min(int(bottom_image.height * img_ratio), available_height)
-    
-    bottom_resized = bottom_image.resize((text_max_width, img_height))
-    img_y = canvas_height - img_height - padding
-    
-    canvas.paste(bottom_resized, (padding, img_y))
+    _paste(canvas, weekly_image, weekly_size, (PADDING, CANVAS_HEIGHT - weekly_size[1] - PADDING))
 
     # ================= RIGHT COLUMN =================
+    right_x = LEFT_WIDTH + PADDING
+    y = PADDING
+    for img in daily_images:
+        _paste(canvas, img, daily_size, (right_x, y))
+        y += daily_slot_spacing(num_weeks) + PADDING
 
-    right_x = left_width + padding
-    img_width = right_width - 2 * padding
-    available_height = canvas_height - 2 * padding
-    img_height = (available_height - 3 * padding) // num_weeks
-
-    y = padding
-    for img in images[:num_weeks]:
-        ratio = img_width / img.width
-        new_height = min(int(img.height * ratio), img_height)
-        resized = img.resize((img_width, new_height))
-        canvas.paste(resized, (right_x, y))
-        y += img_height + padding
-
-    # ---- SAVE ----
-    canvas.save(f"{output_path}/{output_name}.png", format="PNG")
+    return canvas
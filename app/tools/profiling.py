@@ -0,0 +1,216 @@
+"""
+Per-stage instrumentation of the report pipeline.
+
+Code paths wrap their work in stage(name); every call records wall time, CPU
+time and memory (peak RSS of the process and, with PROFILE_MEMORY enabled,
+the tracemalloc peak of the stage). Report timings are recorded per EEID with
+record_user_time. At the end of a run write_run_report emits a JSON and a CSV
+summary of every stage, the per-report percentiles and the encode time and
+size per output format.
+
+Sinks registered with add_stage_sink receive each stage record as it is taken
+(e.g. to forward metrics elsewhere). Records taken in worker processes are
+collected with drain_records and merged back with merge_records.
+"""
+import csv
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List
+import numpy as np
+from tools.config import PROFILE_MEMORY
+from tools.utils import peak_rss_mb
+
+# Pipeline stages, in run order (any other name is accepted too)
+STAGES = ["query", "fetch", "preprocess", "aggregation", "chart_render", "composite", "encode", "csv_write", "archive"]
+
+_STAGE_RECORDS: List[dict] = []
+_USER_TIMES: Dict[str, Dict[str, float]] = {}
+_SINKS: List[Callable[[dict], None]] = []
+_RUN_STARTED_AT = datetime.now()
+
+def add_stage_sink(sink: Callable[[dict], None]):
+    """Registers a callable that receives every stage record as it is taken."""
+    _SINKS.append(sink)
+
+def reset_profiling():
+    """Forgets every record of the current run and starts a new one."""
+    global _RUN_STARTED_AT
+    _STAGE_RECORDS.clear()
+    _USER_TIMES.clear()
+    _RUN_STARTED_AT = datetime.now()
+
+def _record(entry: dict):
+    _STAGE_RECORDS.append(entry)
+    for sink in _SINKS:
+        sink(entry)
+
+@contextmanager
+def stage(name: str, **labels):
+    """
+    Records the wall time, CPU time and memory of the wrapped block under name.
+
+    The CPU time is that of the calling thread (time.thread_time), so stages
+    running on helper threads (background encodes, archive parts, extract
+    slices) and the main thread's stages do not count each other's work.
+    labels (e.g. eeid=..., rows=...) are stored with the record. Nested stages
+    are recorded independently; the tracemalloc peak is only taken by the
+    outermost stage so nested ones do not reset it.
+    """
+    trace = PROFILE_MEMORY and not tracemalloc.is_tracing()
+    if trace:
+        tracemalloc.start()
+    wall_start = time.perf_counter()
+    cpu_start = time.thread_time()
+    try:
+        yield labels
+    finally:
+        entry = {
+            "stage": name,
+            "wall_seconds": time.perf_counter() - wall_start,
+            "cpu_seconds": time.thread_time() - cpu_start,
+            "peak_rss_mb": peak_rss_mb(),
+            "traced_peak_mb": None,
+        }
+        if trace:
+            entry["traced_peak_mb"] = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+            tracemalloc.stop()
+        entry.update(labels)
+        _record(entry)
+
+def record_user_time(report_type, eeid, seconds: float):
+    """Records how long the report of an EEID took to render."""
+    _USER_TIMES.setdefault(str(report_type), {})[eeid] = seconds
+
+def drain_records() -> List[dict]:
+    """Returns and forgets the stage records of this process (used by worker processes)."""
+    records = list(_STAGE_RECORDS)
+    _STAGE_RECORDS.clear()
+    return records
+
+def merge_records(records: List[dict]):
+    """Adds stage records taken in another process to this run."""
+    for entry in records:
+        _record(entry)
+
+def summarize_stages() -> Dict[str, dict]:
+    """Aggregates the stage records by stage name: calls, total and max times, memory peaks."""
+    by_stage: Dict[str, List[dict]] = {}
+    for entry in _STAGE_RECORDS:
+        by_stage.setdefault(entry["stage"], []).append(entry)
+    order = STAGES + sorted(set(by_stage) - set(STAGES))
+    summary = {}
+    for name in order:
+        entries = by_stage.get(name)
+        if not entries:
+            continue
+        wall = np.array([e["wall_seconds"] for e in entries])
+        rss = [e["peak_rss_mb"] for e in entries if e["peak_rss_mb"] is not None]
+        traced = [e["traced_peak_mb"] for e in entries if e["traced_peak_mb"] is not None]
+        summary[name] = {
+            "calls": len(entries),
+            "wall_seconds": float(wall.sum()),
+            "wall_p50": float(np.percentile(wall, 50)),
+            "wall_p95": float(np.percentile(wall, 95)),
+            "wall_max": float(wall.max()),
+            "cpu_seconds": float(sum(e["cpu_seconds"] for e in entries)),
+            "peak_rss_mb": max(rss) if rss else None,
+            "traced_peak_mb": max(traced) if traced else None,
+        }
+    return summary
+
+def background_encodes() -> bool:
+    """True when reports of this run were encoded by the background pool (see report_encoding.save_report)."""
+    return any(entry["stage"] == "encode" and entry.get("background") for entry in _STAGE_RECORDS)
+
+def summarize_user_times(slowest: int = 10) -> Dict[str, dict]:
+    """
+    Per report type: count, mean, p50, p95, max and the slowest EEIDs.
+    includes_encoding is False when the reports were encoded in the
+    background: their times then stop once the canvas is handed over.
+    """
+    includes_encoding = not background_encodes()
+    summary = {}
+    for report_type, times in _USER_TIMES.items():
+        values = np.fromiter(times.values(), dtype=float)
+        summary[report_type] = {
+            "reports": len(values),
+            "mean": float(values.mean()),
+            "p50": float(np.percentile(values, 50)),
+            "p95": float(np.percentile(values, 95)),
+            "max": float(values.max()),
+            "total": float(values.sum()),
+            "slowest": sorted(times.items(), key=lambda item: item[1], reverse=True)[:slowest],
+            "includes_encoding": includes_encoding,
+        }
+    return summary
+
+def summarize_encodes() -> Dict[str, dict]:
+    """
+    Per output format of the "encode" stage: files, seconds and bytes written.
+    The cpu_* figures are the encoder's own time; the wall time of background
+    encodes also counts waiting for the GIL while the next report renders.
+    """
+    by_format: Dict[str, List[dict]] = {}
+    for entry in _STAGE_RECORDS:
+        if entry["stage"] == "encode" and entry.get("bytes") is not None:
+            by_format.setdefault(entry.get("format"), []).append(entry)
+    summary = {}
+    for report_format, entries in by_format.items():
+        wall = np.array([e["wall_seconds"] for e in entries])
+        cpu = np.array([e["cpu_seconds"] for e in entries])
+        sizes = np.array([e["bytes"] for e in entries], dtype=float)
+        summary[report_format] = {
+            "files": len(entries),
+            "background": sum(1 for e in entries if e.get("background")),
+            "cpu_seconds": float(cpu.sum()),
+            "cpu_p50": float(np.percentile(cpu, 50)),
+            "cpu_p95": float(np.percentile(cpu, 95)),
+            "wall_seconds": float(wall.sum()),
+            "wall_p50": float(np.percentile(wall, 50)),
+            "wall_p95": float(np.percentile(wall, 95)),
+            "total_mb": float(sizes.sum() / (1024 * 1024)),
+            "mean_kb": float(sizes.mean() / 1024),
+        }
+    return summary
+
+def run_report() -> dict:
+    """Returns the summary of the current run as a JSON-serializable dict."""
+    return {
+        "started_at": _RUN_STARTED_AT.isoformat(timespec="seconds"),
+        "finished_at": datetime.now().isoformat(timespec="seconds"),
+        "peak_rss_mb": peak_rss_mb(),
+        "stages": summarize_stages(),
+        "reports": summarize_user_times(),
+        "formats": summarize_encodes(),
+    }
+
+def write_run_report(folder) -> Path:
+    """
+    Writes run_report_<timestamp>.json (full summary) and .csv (one row per
+    stage) to folder and returns the JSON path.
+    """
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    report = run_report()
+    json_path = folder / f"run_report_{_RUN_STARTED_AT:%Y%m%d_%H%M%S}.json"
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    fields = ["stage", "calls", "wall_seconds", "wall_p50", "wall_p95", "wall_max", "cpu_seconds", "peak_rss_mb", "traced_peak_mb"]
+    with open(json_path.with_suffix(".csv"), "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        for name, values in report["stages"].items():
+            writer.writerow({"stage": name, **values})
+    return json_path
+
+def print_stage_summary():
+    """Prints the wall and CPU time of every stage of the run."""
+    for name, values in summarize_stages().items():
+        print(f"{name:>14}: {values['wall_seconds']:8.2f}s wall {values['cpu_seconds']:8.2f}s cpu ({values['calls']} calls, p95 {values['wall_p95']:.3f}s)")
+    for report_format, values in summarize_encodes().items():
+        print(f"{report_format:>14}: {values['files']} files, {values['total_mb']:.1f} MB ({values['mean_kb']:.0f} KB each), p50 encode {values['cpu_p50']:.3f}s cpu"
+              + (f" ({values['background']} in the background)" if values['background'] else ""))
@@ -0,0 +1,89 @@
+"""
+Encoding of the finished report canvases to files.
+
+REPORT_FORMAT selects the output format (png, webp or jpeg) and the
+PNG_* / WEBP_* / JPEG_* settings its encoder options. Every encode is
+recorded as an "encode" stage labelled with the format, the file size and
+whether it ran in the background, so the run report shows time and bytes
+per format (see profiling.summarize_encodes).
+
+With background=True the canvas is handed to a pool of ENCODE_THREADS
+threads and the caller goes on with the next report; Pillow releases the
+GIL while compressing, so encoding overlaps the next user's charts when
+there is a spare core (ENCODE_THREADS defaults to 0 on a single core).
+wait_for_encodes must be called before the files are used.
+"""
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import List
+from PIL import Image
+from tools.profiling import stage
+from tools.config import REPORT_FORMAT, PNG_COMPRESS_LEVEL, PNG_OPTIMIZE, WEBP_QUALITY, WEBP_METHOD, JPEG_QUALITY, ENCODE_THREADS
+
+# Format -> (file suffix, Pillow save options)
+REPORT_FORMATS = {
+    "png": (".png", {"format": "PNG", "compress_level": PNG_COMPRESS_LEVEL, "optimize": PNG_OPTIMIZE}),
+    "webp": (".webp", {"format": "WEBP", "quality": WEBP_QUALITY, "method": WEBP_METHOD}),
+    "jpeg": (".jpg", {"format": "JPEG", "quality": JPEG_QUALITY, "optimize": True}),
+}
+
+# Background encodes queued per thread before the caller waits for the oldest one (bounds the canvases held in memory)
+MAX_PENDING_PER_THREAD = 2
+
+_POOL = None
+_PENDING: List[Future] = []
+
+def report_suffix(report_format: str = None) -> str:
+    """File suffix of the reports in report_format (REPORT_FORMAT by default)."""
+    return _format_options(report_format)[0]
+
+def _format_options(report_format: str = None):
+    report_format = report_format or REPORT_FORMAT
+    if report_format not in REPORT_FORMATS:
+        raise ValueError(f"Unknown report format {report_format!r}; expected one of {', '.join(REPORT_FORMATS)}")
+    return REPORT_FORMATS[report_format]
+
+def encode_report(canvas: Image.Image, output_file: Path, report_format: str = None, background: bool = False) -> Path:
+    """Writes canvas to output_file and closes it. A half-written file is removed if encoding fails."""
+    report_format = report_format or REPORT_FORMAT
+    _, options = _format_options(report_format)
+    output_file = Path(output_file)
+    try:
+        with stage("encode", format=report_format, background=background) as labels:
+            canvas.save(output_file, **options)
+            labels["bytes"] = output_file.stat().st_size
+    except BaseException:
+        output_file.unlink(missing_ok=True)
+        raise
+    finally:
+        canvas.close()
+    return output_file
+
+def save_report(canvas: Image.Image, output_path, output_name: str, report_format: str = None, background: bool = False) -> Path:
+    """
+    Encodes canvas as output_path/output_name + the format's suffix and
+    returns the path. With background=True (and ENCODE_THREADS > 0) the file
+    is written by the encoding pool; call wait_for_encodes before using it.
+    """
+    output_file = Path(output_path) / f"{output_name}{report_suffix(report_format)}"
+    if not background or ENCODE_THREADS <= 0:
+        return encode_report(canvas, output_file, report_format)
+    global _POOL
+    if _POOL is None:
+        _POOL = ThreadPoolExecutor(max_workers=ENCODE_THREADS, thread_name_prefix="report-encode")
+    if len(_PENDING) >= ENCODE_THREADS * MAX_PENDING_PER_THREAD:
+        _PENDING.pop(0).result()
+    _PENDING.append(_POOL.submit(encode_report, canvas, output_file, report_format, True))
+    return output_file
+
+def wait_for_encodes():
+    """Waits for every background encode; re-raises the first failure after all of them finished."""
+    pending = list(_PENDING)
+    _PENDING.clear()
+    error = None
+    for future in pending:
+        exception = future.exception()
+        if exception is not None and error is None:
+            error = exception
+    if error is not None:
+        raise error
@@ -0,0 +1,65 @@
+"""
+Manifest of the reports already rendered in a reports folder.
+
+Each reports folder (gap_reports/, zero_prod_reports/, randy_reports/) keeps a
+.report_manifest.json mapping every EEID to a fingerprint of the data its
+report was built from, the renderer version and the report file. A report is
+rendered again only when its fingerprint changed or its file is gone.
+"""
+import hashlib
+import json
+from pathlib import Path
+from typing import Dict
+import pandas as pd
+from tools.config import CHART_COLUMNS, RENDERER_VERSION
+
+MANIFEST_FILE_NAME = ".report_manifest.json"
+
+# Columns of the daily and weekly slices that end up in a report
+FINGERPRINT_DAILY_COLUMNS = ['Date', 'Week'] + CHART_COLUMNS + ['Total Hours']
+FINGERPRINT_WEEKLY_COLUMNS = ['Week'] + CHART_COLUMNS + ['Daily Productive Average', 'Total Hours']
+
+def fingerprint_user(daily_user_df: pd.DataFrame, weekly_user_df: pd.DataFrame, *extra) -> str:
+    """
+    Hashes the daily and weekly input slice of one employee, the renderer
+    version and any extra values that show on the report (title dates, name).
+    """
+    digest = hashlib.sha1(RENDERER_VERSION.encode("utf-8"))
+    for df, columns in ((daily_user_df, FINGERPRINT_DAILY_COLUMNS), (weekly_user_df, FINGERPRINT_WEEKLY_COLUMNS)):
+        ordered = df[columns].sort_values(columns[0])
+        digest.update(pd.util.hash_pandas_object(ordered, index=False).to_numpy().tobytes())
+    for value in extra:
+        digest.update(b"\x00" + str(value).encode("utf-8"))
+    return digest.hexdigest()
+
+def load_manifest(reports_folder) -> Dict[str, dict]:
+    """Reads the manifest of a reports folder (empty if there is none yet)."""
+    try:
+        with open(Path(reports_folder) / MANIFEST_FILE_NAME, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_manifest(reports_folder, manifest: Dict[str, dict]):
+    """Writes the manifest of a reports folder atomically."""
+    reports_folder = Path(reports_folder)
+    reports_folder.mkdir(parents=True, exist_ok=True)
+    tmp_file = reports_folder / f"{MANIFEST_FILE_NAME}.tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    tmp_file.replace(reports_folder / MANIFEST_FILE_NAME)
+
+def is_up_to_date(manifest: Dict[str, dict], reports_folder, eeid, fingerprint: str) -> bool:
+    """True when the EEID's report was rendered from the same fingerprint and its file still exists."""
+    entry = manifest.get(eeid)
+    if entry is None or entry.get("fingerprint") != fingerprint:
+        return False
+    return (Path(reports_folder) / entry["file"]).exists()
+
+def record_report(manifest: Dict[str, dict], reports_folder, eeid, fingerprint: str, report_file: Path):
+    """Stores a rendered report in the manifest, deleting the previous file if its name changed."""
+    relative_file = Path(report_file).relative_to(reports_folder).as_posix()
+    previous = manifest.get(eeid, {}).get("file")
+    if previous and previous != relative_file:
+        (Path(reports_folder) / previous).unlink(missing_ok=True)
+    manifest[eeid] = {"fingerprint": fingerprint, "file": relative_file, "renderer": RENDERER_VERSION}